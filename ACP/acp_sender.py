@@ -1,8 +1,13 @@
 import cv2
+import sys
 import threading
 import time
+from pathlib import Path
 from acpcomms.streamer import Streamer 
 
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'ACP_comm_test'))
+from ACP.acpcomms.python3.jpeg_encoder import JpegEncoder
+
 
 # Define chunk size for splitting JPEG data 
 CHUNK_SIZE = 65000 - 4
@@ -45,6 +50,9 @@ def start_stream():
     # Start metadata transmission thread in background
     threading.Thread(target=send_metadata, daemon=True).start()
 
+    # TurboJPEG when installed, OpenCV otherwise
+    encoder = JpegEncoder(quality=80)
+
     while True:
         # Capture frame from camera
         ret, frame = camera.read()
@@ -52,8 +60,7 @@ def start_stream():
             break
 
         # Encode frame as JPEG
-        _, buffer = cv2.imencode('.jpg', frame)
-        data = buffer.tobytes()
+        data = encoder.encode(frame)
 
         # Split JPEG data into chunks and send with checksum
         for i in range(0, len(data), CHUNK_SIZE):
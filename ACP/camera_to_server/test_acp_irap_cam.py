@@ -5,125 +5,29 @@ import sys
 import time
 import zlib
 import threading
+from pathlib import Path
 import cv2
 import numpy as np
 from bson import BSON
-from CameraCalibration.CalibrationConfig import *
 
 # === IMPORT STREAMER ===
 from acpcomms.streamer import Streamer  # adjust import path as needed
 
 # ================= CAMERA CLASS =================
-if sys.version_info.major == 2:
-    print('Please run this program with python3!')
-    sys.exit(0)
-
-class Camera:
-    def __init__(self, resolution=(640, 480)):
-        self.cap = None
-        self.width = resolution[0]
-        self.height = resolution[1]
-        self.frame = None
-        self.opened = False
-        self.detected_colors = set()
-
-        self.param_data = np.load(calibration_param_path + '.npz')
-        self.mtx = self.param_data['mtx_array']
-        self.dist = self.param_data['dist_array']
-
-        self.newcameramtx, _ = cv2.getOptimalNewCameraMatrix(
-            self.mtx, self.dist,
-            (self.width, self.height), 0,
-            (self.width, self.height)
-        )
-
-        self.mapx, self.mapy = cv2.initUndistortRectifyMap(
-            self.mtx, self.dist, None,
-            self.newcameramtx,
-            (self.width, self.height), 5
-        )
-
-        self.color_ranges = {
-            'red': [((0, 120, 70), (10, 255, 255)),
-                    ((170, 120, 70), (180, 255, 255))],
-            'green': [((36, 50, 70), (89, 255, 255))],
-            'blue': [((90, 50, 70), (128, 255, 255))]
-        }
-
-        self.color_draw = {
-            'red': (0, 0, 255),
-            'green': (0, 255, 0),
-            'blue': (255, 0, 0)
-        }
+# Shared with IRAP_Bot: capture, undistortion and color detection live there
+sys.path.append(str(Path(__file__).resolve().parents[2] / 'IRAP_Bot'))
+from Camera import Camera
 
-        self.th = threading.Thread(target=self.camera_task, daemon=True)
-        self.th.start()
-
-    def camera_open(self):
-        self.cap = cv2.VideoCapture(-1)
-        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('Y', 'U', 'Y', 'V'))
-        self.cap.set(cv2.CAP_PROP_FPS, 30)
-        self.cap.set(cv2.CAP_PROP_SATURATION, 40)
-        self.opened = True
-
-    def camera_close(self):
-        self.opened = False
-        time.sleep(0.2)
-        if self.cap:
-            self.cap.release()
-        self.cap = None
-
-    def camera_task(self):
-        while True:
-            if self.opened and self.cap and self.cap.isOpened():
-                ret, frame_tmp = self.cap.read()
-                if not ret:
-                    continue
-
-                frame_resize = cv2.resize(
-                    frame_tmp, (self.width, self.height),
-                    interpolation=cv2.INTER_NEAREST
-                )
-
-                frame = cv2.remap(
-                    frame_resize, self.mapx, self.mapy,
-                    cv2.INTER_LINEAR
-                )
-
-                hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-                self.detected_colors.clear()
-
-                for color_name, ranges in self.color_ranges.items():
-                    mask = None
-                    for lower, upper in ranges:
-                        m = cv2.inRange(hsv, np.array(lower), np.array(upper))
-                        mask = m if mask is None else cv2.bitwise_or(mask, m)
-
-                    mask = cv2.morphologyEx(
-                        mask, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8)
-                    )
-
-                    contours, _ = cv2.findContours(
-                        mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-                    )
-
-                    if contours:
-                        c = max(contours, key=cv2.contourArea)
-                        if cv2.contourArea(c) > 1500:
-                            self.detected_colors.add(color_name)
-                            x, y, w, h = cv2.boundingRect(c)
-                            cv2.rectangle(frame, (x, y), (x + w, y + h),
-                                          self.color_draw[color_name], 2)
-                            cv2.putText(frame, color_name, (x, y - 5),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.6,
-                                        self.color_draw[color_name], 2)
-                self.frame = frame
-            else:
-                time.sleep(0.01)
+sys.path.append(str(Path(__file__).resolve().parents[2] / 'ACP_comm_test'))
+from ACP.acpcomms.python3.jpeg_encoder import JpegEncoder
 
 # ================= STREAMER CONFIG =================
 CHUNK_SIZE = 65000 - 4
 
+# "MJPG" forwards the camera's own JPEGs untouched (no decode/re-encode,
+# no overlays); "YUYV" decodes every frame and draws detections on it
+CAPTURE_FORMAT = "YUYV"
+
 # Video streamer on port 9998
 video_streamer = Streamer()
 video_streamer.configure({
@@ -144,9 +48,11 @@ metadata_streamer.connect()
 
 # ================= HELPERS =================
 def get_color_status(camera: Camera):
-    if not camera.detected_colors:
+    # detected_colors is built from one immutable snapshot, never half-updated
+    colors = camera.detected_colors
+    if not colors:
         return "none"
-    return sorted(camera.detected_colors)
+    return sorted(colors)
 
 # ================= METADATA THREAD =================
 def metadata_loop(camera: Camera):
@@ -163,21 +69,21 @@ def metadata_loop(camera: Camera):
 # ================= STREAM THREAD =================
 def stream_loop(camera: Camera):
     JPEG_QUALITY = 70
+    encoder = JpegEncoder(quality=JPEG_QUALITY, subsampling="420")
+    seq = 0
 
     while True:
-        frame = camera.frame
-        if frame is None:
-            time.sleep(0.01)
-            continue
-
-        ok, jpeg = cv2.imencode(
-            ".jpg", frame,
-            [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
-        )
-        if not ok:
-            continue
-
-        data = jpeg.tobytes()
+        if camera.passthrough:
+            seq, _, data = camera.wait_jpeg(seq, timeout=1.0)
+            if data is None:
+                continue
+        else:
+            seq, _, frame = camera.wait_frame(seq, timeout=1.0)
+            if frame is None:
+                continue
+            camera.draw_detections(frame)
+            data = encoder.encodeFrame(seq, frame)
+
         for i in range(0, len(data), CHUNK_SIZE):
             video_streamer.sendChunkWithChecksum(data[i:i + CHUNK_SIZE])
 
@@ -185,21 +91,22 @@ def stream_loop(camera: Camera):
 
 # ================= MAIN =================
 if __name__ == "__main__":
-    my_camera = Camera()
+    my_camera = Camera(capture_format=CAPTURE_FORMAT)
     my_camera.camera_open()
 
     threading.Thread(target=metadata_loop, args=(my_camera,), daemon=True).start()
     threading.Thread(target=stream_loop, args=(my_camera,), daemon=True).start()
 
     # === DEBUG DISPLAY LOOP ===
+    seq = 0
     while True:
-        frame = my_camera.frame
+        seq, _, frame = my_camera.wait_frame(seq, timeout=1.0)
         if frame is not None:
-            cv2.imshow("Camera Stream", frame)
+            cv2.imshow("Camera Stream", my_camera.draw_detections(frame))
             if cv2.waitKey(1) & 0xFF == 27:
                 break
 
-    my_camera.camera_close()
+    my_camera.close()
     video_streamer.disconnect()
     metadata_streamer.disconnect()
     cv2.destroyAllWindows()
@@ -0,0 +1,130 @@
+"""
+EndpointRegistry - Name-based lookup of local ZeroMQ endpoints
+Lets co-located Messenger instances use inproc:// or ipc:// instead of TCP loopback
+"""
+import os
+import json
+import tempfile
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "*", "0.0.0.0", "::1")
+
+
+class EndpointRegistry:
+    """
+    Registry of endpoints bound by Messenger instances on this host
+
+    Names registered in this process resolve to inproc:// endpoints, names
+    registered by another process on the same host resolve to ipc:// endpoints.
+    Cross-process entries are small JSON files in a shared runtime directory.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory: str = directory or os.environ.get(
+            "ACP_ENDPOINT_DIR", os.path.join(tempfile.gettempdir(), "acp-endpoints"))
+        self.local: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def nameForEndpoint(endpoint: str) -> Optional[str]:
+        """
+        Derive a registry name from a loopback/wildcard TCP endpoint
+
+        Args:
+            endpoint: ZMQ endpoint, e.g. "tcp://127.0.0.1:6000"
+
+        Returns:
+            str: Name such as "port-6000", or None if the endpoint is not local
+        """
+        parsed = urlparse(endpoint)
+        if parsed.scheme != "tcp":
+            return None
+        host, _, port = parsed.netloc.rpartition(":")
+        if host.strip("[]") not in LOCAL_HOSTS or not port.isdigit():
+            return None
+        return f"port-{port}"
+
+    def inprocEndpoint(self, name: str) -> str:
+        """Get the inproc endpoint used for a name"""
+        return f"inproc://acp-{name}"
+
+    def ipcEndpoint(self, name: str) -> str:
+        """Get the ipc endpoint used for a name"""
+        return f"ipc://{os.path.join(self.directory, name)}.ipc"
+
+    def register(self, name: str, inproc: Optional[str], ipc: Optional[str]) -> None:
+        """
+        Publish the local endpoints bound under a name
+
+        Args:
+            name: Registry name
+            inproc: inproc endpoint bound in this process (optional)
+            ipc: ipc endpoint bound in this process (optional)
+        """
+        with self.lock:
+            if inproc is not None:
+                self.local[name] = inproc
+        if ipc is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._entryPath(name)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"pid": os.getpid(), "endpoint": ipc}, f)
+            os.replace(tmp, path)
+
+    def unregister(self, name: str) -> None:
+        """Remove a name registered by this process"""
+        with self.lock:
+            self.local.pop(name, None)
+        entry = self._readEntry(name)
+        if entry is not None and entry.get("pid") == os.getpid():
+            try:
+                os.remove(self._entryPath(name))
+            except OSError:
+                pass
+
+    def resolve(self, name: str) -> Optional[str]:
+        """
+        Find the fastest local endpoint for a name
+
+        Returns:
+            str: inproc or ipc endpoint, or None if nothing local is bound
+        """
+        with self.lock:
+            endpoint = self.local.get(name)
+        if endpoint is not None:
+            return endpoint
+
+        entry = self._readEntry(name)
+        if entry is None or not self._processAlive(entry.get("pid")):
+            return None
+        return entry.get("endpoint")
+
+    def _entryPath(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _readEntry(self, name: str) -> Optional[dict]:
+        try:
+            with open(self._entryPath(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _processAlive(pid: Optional[int]) -> bool:
+        if not isinstance(pid, int):
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+
+# Shared by every Messenger in the process so inproc names are visible to all
+defaultRegistry = EndpointRegistry()
@@ -0,0 +1,127 @@
+"""
+FrameBroadcaster - One producer, many viewers of the latest video frame
+Each frame is stored once and handed to every subscriber as the same bytes
+"""
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+
+# Header of one part of a multipart/x-mixed-replace (MJPEG) HTTP response
+MJPEG_BOUNDARY = "frame"
+MJPEG_HEADER = b"--" + MJPEG_BOUNDARY.encode() + b"\r\nContent-Type: image/jpeg\r\n\r\n"
+
+
+class FrameBroadcaster:
+    """
+    Latest-frame broadcaster for encoded frames
+
+    A single producer calls publish() with every encoded frame. Subscribers
+    wait on a condition variable for a sequence number newer than the last
+    one they sent and always get the newest frame, so a slow client skips
+    frames instead of queueing them. Frames, and the MJPEG part built around
+    them, are created once per publish() however many clients are watching.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.data: Optional[bytes] = None
+        self.part: Optional[bytes] = None
+        self.stamp = 0.0
+        self.closed = False
+        self.subscribers = 0
+
+    def publish(self, data: bytes, stamp: Optional[float] = None) -> int:
+        """
+        Make data the latest frame and wake every waiting subscriber
+
+        Args:
+            data: Encoded frame (JPEG)
+            stamp: Capture time (default: now)
+
+        Returns:
+            int: Sequence number of the published frame
+        """
+        part = MJPEG_HEADER + data + b"\r\n"
+        with self.cond:
+            self.seq += 1
+            self.data = data
+            self.part = part
+            self.stamp = time.time() if stamp is None else stamp
+            self.cond.notify_all()
+            return self.seq
+
+    def latest(self) -> Tuple[int, Optional[bytes]]:
+        """Return (seq, data) of the newest frame, (0, None) before the first publish"""
+        with self.cond:
+            return self.seq, self.data
+
+    def wait(self, lastSeq: int, timeout: Optional[float] = None) -> Tuple[int, Optional[bytes]]:
+        """
+        Block until a frame newer than lastSeq is published
+
+        Args:
+            lastSeq: Sequence number of the last frame the caller has seen
+            timeout: Seconds to wait, None to wait forever
+
+        Returns:
+            (int, bytes): Sequence number and frame, or (lastSeq, None) on
+            timeout or after close()
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > lastSeq or self.closed, timeout):
+                return lastSeq, None
+            if self.closed:
+                return lastSeq, None
+            return self.seq, self.data
+
+    def subscribe(self, mjpeg: bool = False, maxFps: Optional[float] = None) -> Iterator[bytes]:
+        """
+        Yield every new frame until close(), skipping frames the caller was too slow for
+
+        Args:
+            mjpeg: Yield complete multipart MJPEG parts instead of bare frames
+            maxFps: Upper bound on frames per second sent to this subscriber
+                    (default: None, every published frame)
+        """
+        minInterval = 1.0 / maxFps if maxFps else 0.0
+        nextSend = 0.0
+        with self.cond:
+            self.subscribers += 1
+        try:
+            lastSeq = 0
+            while True:
+                if minInterval:
+                    delay = nextSend - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                with self.cond:
+                    self.cond.wait_for(lambda: self.seq > lastSeq or self.closed)
+                    if self.closed:
+                        return
+                    lastSeq = self.seq
+                    data = self.part if mjpeg else self.data
+                nextSend = time.monotonic() + minInterval
+                yield data
+        finally:
+            with self.cond:
+                self.subscribers -= 1
+
+    def mjpegStream(self, maxFps: Optional[float] = None) -> Iterator[bytes]:
+        """Generator for a Flask Response with mimetype mjpegMimetype()"""
+        return self.subscribe(mjpeg=True, maxFps=maxFps)
+
+    @staticmethod
+    def mjpegMimetype() -> str:
+        return f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+
+    def subscriberCount(self) -> int:
+        with self.cond:
+            return self.subscribers
+
+    def close(self):
+        """End every subscription, e.g. when the camera stops delivering frames"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
@@ -0,0 +1,141 @@
+"""
+JpegEncoder - JPEG encoding for the video streaming path
+Uses libjpeg-turbo (PyTurboJPEG) when installed, OpenCV otherwise
+"""
+import threading
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import (TurboJPEG, TJPF_BGR, TJPF_GRAY,
+                           TJSAMP_444, TJSAMP_422, TJSAMP_420, TJSAMP_GRAY)
+except ImportError:
+    TurboJPEG = None
+
+
+class JpegEncoder:
+    """
+    JPEG encoder with a pluggable backend
+
+    The TurboJPEG backend encodes straight into a preallocated buffer that
+    is reused between frames. encodeFrame() memoizes the last result by
+    frame sequence number, so every consumer of one frame shares a single
+    encode instead of encoding it again.
+    """
+
+    SUBSAMPLING = ("444", "422", "420", "gray")
+
+    def __init__(self, quality: int = 80, subsampling: str = "420", backend: str = "auto"):
+        """
+        Args:
+            quality: JPEG quality 1-100 (default: 80)
+            subsampling: Chroma subsampling "444", "422", "420" or "gray" (default: "420")
+            backend: "turbojpeg", "opencv" or "auto" (default: "auto")
+        """
+        if subsampling not in self.SUBSAMPLING:
+            raise ValueError(f"Invalid subsampling: {subsampling}")
+        if backend not in ("auto", "turbojpeg", "opencv"):
+            raise ValueError(f"Invalid backend: {backend}")
+
+        self.quality = quality
+        self.subsampling = subsampling
+        self.turbo = None
+        if backend != "opencv" and TurboJPEG is not None:
+            try:
+                self.turbo = TurboJPEG()
+            except Exception as e:
+                # Python binding present but libturbojpeg missing
+                if backend == "turbojpeg":
+                    raise RuntimeError(f"TurboJPEG unavailable: {e}")
+        elif backend == "turbojpeg":
+            raise RuntimeError("TurboJPEG unavailable: PyTurboJPEG not installed")
+        self.backend = "turbojpeg" if self.turbo is not None else "opencv"
+
+        self.buffer: Optional[bytearray] = None
+        self.bufferKey: Optional[Tuple[int, ...]] = None
+        self.lock = threading.Lock()
+        self.frameLock = threading.Lock()
+        self.lastSeq: Optional[int] = None
+        self.lastData: Optional[bytes] = None
+
+        if self.turbo is not None:
+            self.turboSubsample = {"444": TJSAMP_444, "422": TJSAMP_422,
+                                   "420": TJSAMP_420, "gray": TJSAMP_GRAY}[subsampling]
+        else:
+            self.cvParams = [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)]
+            sampling = getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR", None)
+            factor = getattr(cv2, f"IMWRITE_JPEG_SAMPLING_FACTOR_{subsampling}", None)
+            if sampling is not None and factor is not None:
+                self.cvParams += [int(sampling), int(factor)]
+
+    def encodeInto(self, frame: np.ndarray, dst: Optional[bytearray] = None) -> Tuple[memoryview, int]:
+        """
+        Encode a BGR frame into a reusable buffer
+
+        Args:
+            frame: BGR image (grayscale subsampling converts it first)
+            dst: Destination buffer (default: the encoder's own buffer)
+
+        Returns:
+            (memoryview, int): View of the buffer and the JPEG length. The
+            buffer is overwritten by the next call, copy it to keep it.
+        """
+        if self.subsampling == "gray" and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if dst is None:
+            dst = self._ownBuffer(frame)
+
+        if self.turbo is not None:
+            pixel_format = TJPF_BGR if frame.ndim == 3 else TJPF_GRAY
+            _, size = self.turbo.encode(frame, quality=self.quality, pixel_format=pixel_format,
+                                        jpeg_subsample=self.turboSubsample, dst=dst)
+            return memoryview(dst), size
+
+        ok, jpeg = cv2.imencode(".jpg", frame, self.cvParams)
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        size = jpeg.size
+        if len(dst) < size:
+            dst.extend(bytes(size - len(dst)))
+        view = memoryview(dst)
+        view[:size] = jpeg.reshape(-1)
+        return view, size
+
+    def encode(self, frame: np.ndarray) -> bytes:
+        """Encode a BGR frame and return the JPEG as an immutable bytes object"""
+        if self.turbo is None:
+            if self.subsampling == "gray" and frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            ok, jpeg = cv2.imencode(".jpg", frame, self.cvParams)
+            if not ok:
+                raise RuntimeError("JPEG encoding failed")
+            return jpeg.tobytes()
+        with self.lock:
+            view, size = self.encodeInto(frame)
+            return bytes(view[:size])
+
+    def encodeFrame(self, seq: int, frame: np.ndarray) -> bytes:
+        """
+        Encode frame number seq once and share the result
+
+        Consumers asking for the same seq get the same bytes object back
+        instead of triggering another encode.
+        """
+        with self.frameLock:
+            if seq != self.lastSeq or self.lastData is None:
+                self.lastData = self.encode(frame)
+                self.lastSeq = seq
+            return self.lastData
+
+    def _ownBuffer(self, frame: np.ndarray) -> bytearray:
+        key = frame.shape
+        if self.buffer is None or self.bufferKey != key:
+            if self.turbo is not None:
+                size = self.turbo.buffer_size(frame, self.turboSubsample)
+            else:
+                size = frame.size // 2
+            self.buffer = bytearray(size)
+            self.bufferKey = key
+        return self.buffer
@@ -3,12 +3,14 @@ Messenger - ZeroMQ messaging wrapper with internal BSON serialization.
 Publisher/subscriber scripts do NOT need bson, json, or zmq imports.
 """
 
+import os
 import zmq
 import threading
 from typing import Dict, Any, Callable, Optional
 
 # Keep your original package structure
 from .acp_comms import ACPComms
+from .endpoint_registry import defaultRegistry, EndpointRegistry
 
 # Internal serialization
 from bson import dumps as bson_dumps, loads as bson_loads
@@ -27,6 +29,10 @@ class Messenger(ACPComms):
         self.listenerThread: Optional[threading.Thread] = None
         self.listening: bool = False
         self.messageHandler: Optional[Callable[[dict], None]] = None
+        self.registry: EndpointRegistry = defaultRegistry
+        self.registeredName: Optional[str] = None
+        self.localEndpoints: list = []
+        self.ownsContext: bool = False
 
         # ------------------------------------------------------------------
         # Default JSON message template
@@ -65,7 +71,9 @@ class Messenger(ACPComms):
             "REQ": zmq.REQ,
             "REP": zmq.REP,
             "PUSH": zmq.PUSH,
-            "PULL": zmq.PULL
+            "PULL": zmq.PULL,
+            "DEALER": zmq.DEALER,
+            "ROUTER": zmq.ROUTER
         }
 
         if socket_type_str not in socket_type_map:
@@ -73,6 +81,12 @@ class Messenger(ACPComms):
 
         self.socketType = socket_type_map[socket_type_str]
 
+    def _localName(self) -> Optional[str]:
+        """Registry name for this endpoint, None when the fast path is off"""
+        if not self.config.get("localTransport", True):
+            return None
+        return self.config.get("name") or self.registry.nameForEndpoint(self.endpoint)
+
     # -----------------------------
     # Connect / Disconnect
     # -----------------------------
@@ -80,13 +94,21 @@ class Messenger(ACPComms):
         if self.connected:
             raise RuntimeError("Already connected")
 
-        self.context = zmq.Context()
+        name = self._localName()
+
+        # inproc only works between sockets of the same context, so share one
+        self.ownsContext = name is None
+        self.context = zmq.Context() if self.ownsContext else zmq.Context.instance()
         self.socket = self.context.socket(self.socketType)
 
         if self.config.get("bind", False):
             self.socket.bind(self.endpoint)
+            if name is not None:
+                self._bindLocal(name)
         else:
-            self.socket.connect(self.endpoint)
+            # Prefer a co-located peer's inproc/ipc endpoint over TCP loopback
+            local = self.registry.resolve(name) if name is not None else None
+            self.socket.connect(local or self.endpoint)
 
         if self.socketType == zmq.SUB:
             topic = self.config.get("topic", "")
@@ -100,13 +122,45 @@ class Messenger(ACPComms):
 
         self.stopListener()
 
+        if self.registeredName is not None:
+            self.registry.unregister(self.registeredName)
+            self.registeredName = None
+        for endpoint in self.localEndpoints:
+            try:
+                self.socket.unbind(endpoint)
+                if endpoint.startswith("ipc://"):
+                    os.remove(endpoint[len("ipc://"):])
+            except (OSError, zmq.ZMQError):
+                pass
+        self.localEndpoints = []
+
         if self.socket:
             self.socket.close()
-        if self.context:
+        if self.context and self.ownsContext:
             self.context.term()
 
         self.connected = False
 
+    def _bindLocal(self, name: str) -> None:
+        """Also bind inproc/ipc endpoints and publish them under name"""
+        inproc = self.registry.inprocEndpoint(name)
+        ipc = self.registry.ipcEndpoint(name) if zmq.has("ipc") else None
+        try:
+            self.socket.bind(inproc)
+        except zmq.ZMQError:
+            inproc = None
+        if ipc is not None:
+            try:
+                os.makedirs(self.registry.directory, exist_ok=True)
+                self.socket.bind(ipc)
+            except (OSError, zmq.ZMQError):
+                ipc = None
+
+        self.localEndpoints = [e for e in (inproc, ipc) if e is not None]
+        if self.localEndpoints:
+            self.registry.register(name, inproc, ipc)
+            self.registeredName = name
+
     # -----------------------------
     # Internal serialization helpers
     # -----------------------------
@@ -0,0 +1,434 @@
+"""
+Recorder - Rolling on-disk recording of Streamer and Messenger traffic
+RecordingReader - Memory-mapped reader with timestamp seek and replay
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .messenger import Messenger
+    from .streamer import Streamer
+
+
+# Record in a .dat segment: timestamp (ns), channel id, encoding, payload length, then the payload
+RECORD_HEADER = struct.Struct("<qHHI")
+# Entry in the matching .idx file for every record: timestamp (ns), offset in the .dat file
+INDEX_ENTRY = struct.Struct("<qQ")
+
+ENCODING_RAW = 0
+ENCODING_JSON = 1
+
+CHANNELS_FILE = "channels.json"
+
+Record = namedtuple("Record", ["timestamp", "channel", "data"])
+
+
+def _segmentName(startNs: int) -> str:
+    # zero padded so that name order is time order
+    return f"seg-{startNs:020d}"
+
+
+class Recorder:
+    """
+    Appends timestamped records to segment files in one directory
+
+    record() only copies into an in-memory block; a writer thread appends
+    whole blocks to the current segment and its time index, so the disk
+    sees large sequential writes. A block is split between records so no
+    segment grows past segmentBytes, and the oldest segments are deleted
+    before a new one would take the directory past maxBytes.
+    """
+
+    def __init__(self, directory: str, segmentBytes: int = 64 * 1024 * 1024,
+                 maxBytes: int = 1024 * 1024 * 1024, blockBytes: int = 1024 * 1024,
+                 flushInterval: float = 1.0):
+        """
+        Args:
+            directory: Recording directory, created if missing
+            segmentBytes: Size at which a new segment is started (default: 64 MiB)
+            maxBytes: Retention cap for all segments together (default: 1 GiB)
+            blockBytes: Buffered bytes that trigger a write (default: 1 MiB)
+            flushInterval: Longest time in seconds a record stays buffered (default: 1.0)
+        """
+        if segmentBytes > maxBytes:
+            raise ValueError("segmentBytes must not exceed maxBytes")
+        self.directory = directory
+        self.segmentBytes = segmentBytes
+        self.maxBytes = maxBytes
+        self.blockBytes = blockBytes
+        self.flushInterval = flushInterval
+
+        os.makedirs(directory, exist_ok=True)
+        self.channels: Dict[str, int] = _loadChannels(directory)
+
+        self.cond = threading.Condition()
+        self.block = bytearray()
+        self.index = bytearray()
+        self.lastTimestamp = 0
+        self.running = False
+        self.writerThread: Optional[threading.Thread] = None
+
+        # only touched by the writer thread
+        self.dataFile = None
+        self.indexFile = None
+        self.dataSize = 0
+        self.segmentSize = 0
+        self.segmentStartNs = -1
+
+    # -----------------------------
+    # Lifecycle
+    # -----------------------------
+    def start(self) -> None:
+        if self.running:
+            raise RuntimeError("Recorder already running")
+        self.running = True
+        self.writerThread = threading.Thread(target=self._writerLoop, daemon=True)
+        self.writerThread.start()
+
+    def close(self) -> None:
+        """Write out everything buffered and stop the writer thread"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.writerThread is not None:
+            self.writerThread.join()
+            self.writerThread = None
+
+    # -----------------------------
+    # Recording
+    # -----------------------------
+    def record(self, channel: str, data: bytes, timestamp: Optional[int] = None,
+               encoding: int = ENCODING_RAW) -> None:
+        """
+        Buffer one record
+
+        Args:
+            channel: Channel name, e.g. "video" or "telemetry"
+            data: Payload bytes
+            timestamp: Nanoseconds since the epoch (default: now)
+            encoding: ENCODING_RAW or ENCODING_JSON
+
+        Raises:
+            ValueError: If the record alone would not fit in a segment
+        """
+        if RECORD_HEADER.size + len(data) + INDEX_ENTRY.size > self.segmentBytes:
+            raise ValueError(f"{len(data)} byte record does not fit in segmentBytes")
+        with self.cond:
+            channelId = self.channels.get(channel)
+            if channelId is None:
+                channelId = self.channels[channel] = len(self.channels)
+                _saveChannels(self.directory, self.channels)
+            timestamp = time.time_ns() if timestamp is None else timestamp
+            # the index is binary searched, so timestamps never go backwards
+            timestamp = max(timestamp, self.lastTimestamp)
+            self.lastTimestamp = timestamp
+
+            self.index += INDEX_ENTRY.pack(timestamp, len(self.block))
+            self.block += RECORD_HEADER.pack(timestamp, channelId, encoding, len(data))
+            self.block += data
+            if len(self.block) >= self.blockBytes:
+                self.cond.notify()
+
+    def recordMessage(self, channel: str, message: Any, timestamp: Optional[int] = None) -> None:
+        """Record a dict, or an already serialized JSON string, as JSON"""
+        text = message if isinstance(message, str) else json.dumps(message)
+        self.record(channel, text.encode("utf-8"), timestamp, ENCODING_JSON)
+
+    def attachStreamer(self, streamer: "Streamer", channel: str = "video") -> None:
+        """Record every datagram the Streamer's listener receives, then pass it on"""
+        previous = streamer.packetHandler
+
+        def handler(packet):
+            self.record(channel, packet.getData())
+            if previous is not None:
+                previous(packet)
+
+        streamer.setPacketHandler(handler)
+
+    def attachMessenger(self, messenger: "Messenger", channel: str = "telemetry") -> None:
+        """Record every message the Messenger's listener receives, then pass it on"""
+        previous = messenger.messageHandler
+
+        def handler(message):
+            self.recordMessage(channel, message)
+            if previous is not None:
+                previous(message)
+
+        messenger.setMessageHandler(handler)
+
+    # -----------------------------
+    # Writer thread
+    # -----------------------------
+    def _writerLoop(self) -> None:
+        try:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: len(self.block) >= self.blockBytes or not self.running,
+                                       self.flushInterval)
+                    block, index = self.block, self.index
+                    self.block, self.index = bytearray(), bytearray()
+                    running = self.running
+                if block:
+                    try:
+                        self._writeBlock(block, index)
+                    except Exception as e:
+                        print(f"Recorder write error: {e}")
+                if not running:
+                    return
+        finally:
+            self._closeSegment()
+
+    def _writeBlock(self, block: bytearray, index: bytearray) -> None:
+        entries = [INDEX_ENTRY.unpack_from(index, i) for i in range(0, len(index), INDEX_ENTRY.size)]
+        ends = [offset for _, offset in entries[1:]] + [len(block)]
+        first = 0
+        while first < len(entries):
+            if self.dataFile is None:
+                self._openSegment(entries[first][0])
+            # take as many whole records as still fit in the current segment
+            room = self.segmentBytes - self.segmentSize
+            start = entries[first][1]
+            last = first
+            while last < len(entries) and (ends[last] - start
+                                           + (last + 1 - first) * INDEX_ENTRY.size) <= room:
+                last += 1
+            if last == first:
+                # record() guarantees a single record fits in an empty segment
+                self._closeSegment()
+                continue
+
+            # offsets were relative to the block; make them relative to the segment
+            chunkIndex = bytearray()
+            for timestamp, offset in entries[first:last]:
+                chunkIndex += INDEX_ENTRY.pack(timestamp, self.dataSize + offset - start)
+            chunk = memoryview(block)[start:ends[last - 1]]
+
+            # data first: an index entry must never point past the end of the data
+            self.dataFile.write(chunk)
+            self.dataFile.flush()
+            self.indexFile.write(chunkIndex)
+            self.indexFile.flush()
+            self.dataSize += len(chunk)
+            self.segmentSize += len(chunk) + len(chunkIndex)
+            first = last
+
+    def _openSegment(self, startNs: int) -> None:
+        # equal timestamps may span a rollover; never append to the previous segment
+        startNs = max(startNs, self.segmentStartNs + 1)
+        self.segmentStartNs = startNs
+        name = os.path.join(self.directory, _segmentName(startNs))
+        self.dataFile = open(name + ".dat", "ab", buffering=0)
+        self.indexFile = open(name + ".idx", "ab", buffering=0)
+        self.dataSize = self.segmentSize = 0
+        self._enforceRetention()
+
+    def _closeSegment(self) -> None:
+        if self.dataFile is not None:
+            self.dataFile.close()
+            self.indexFile.close()
+            self.dataFile = self.indexFile = None
+
+    def _enforceRetention(self) -> None:
+        """Delete the oldest closed segments until the directory fits in maxBytes"""
+        segments = _listSegments(self.directory)
+        sizes = [_segmentBytes(self.directory, name) for name in segments]
+        total = sum(sizes)
+        # never the newest one, which is the segment being written
+        for name, size in zip(segments[:-1], sizes):
+            if total + self.segmentBytes <= self.maxBytes:
+                break
+            for ext in (".dat", ".idx"):
+                try:
+                    os.remove(os.path.join(self.directory, name + ext))
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+class _Segment:
+    """One memory-mapped segment and its index"""
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self.startNs = int(name.split("-", 1)[1])
+        self.data = _map(os.path.join(directory, name + ".dat"))
+        self.index = _map(os.path.join(directory, name + ".idx"))
+        dataSize = len(self.data) if self.data is not None else 0
+        count = (len(self.index) if self.index is not None else 0) // INDEX_ENTRY.size
+        # a segment that is still being written may end in a partial block
+        while count and self._entry(count - 1)[1] + RECORD_HEADER.size > dataSize:
+            count -= 1
+        self.count = count
+
+    def _entry(self, i: int) -> Tuple[int, int]:
+        return INDEX_ENTRY.unpack_from(self.index, i * INDEX_ENTRY.size)
+
+    def timestamp(self, i: int) -> int:
+        return self._entry(i)[0]
+
+    def find(self, timestamp: int) -> int:
+        """Index of the first record at or after timestamp (binary search)"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def read(self, i: int) -> Tuple[int, int, int, bytes]:
+        offset = self._entry(i)[1]
+        timestamp, channelId, encoding, length = RECORD_HEADER.unpack_from(self.data, offset)
+        start = offset + RECORD_HEADER.size
+        return timestamp, channelId, encoding, self.data[start:start + length]
+
+    def close(self) -> None:
+        for m in (self.data, self.index):
+            if m is not None:
+                m.close()
+
+
+class RecordingReader:
+    """
+    Reads a Recorder directory through memory maps
+
+    seek() binary searches the segment start times and then the segment's
+    time index, so finding a timestamp costs O(log n) reads however long
+    the recording is. Segments written after the reader was opened are not
+    seen; open a new reader to pick them up.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.channelNames = {cid: name for name, cid in _loadChannels(directory).items()}
+        self.segments: List[_Segment] = [s for s in (_Segment(directory, name)
+                                                     for name in _listSegments(directory)) if s.count]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    def timeRange(self) -> Tuple[int, int]:
+        """(first, last) record timestamps in nanoseconds, (0, 0) when empty"""
+        if not self.segments:
+            return 0, 0
+        last = self.segments[-1]
+        return self.segments[0].timestamp(0), last.timestamp(last.count - 1)
+
+    def seek(self, timestamp: int) -> Tuple[int, int]:
+        """Position (segment, record) of the first record at or after timestamp"""
+        lo, hi = 0, len(self.segments)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.segments[mid].startNs <= timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        seg = max(lo - 1, 0)
+        while seg < len(self.segments):
+            i = self.segments[seg].find(timestamp)
+            if i < self.segments[seg].count:
+                return seg, i
+            seg += 1
+        return len(self.segments), 0
+
+    def read(self, start: Optional[int] = None, end: Optional[int] = None,
+             channels: Optional[Sequence[str]] = None) -> Iterator[Record]:
+        """
+        Yield records with start <= timestamp < end, oldest first
+
+        Args:
+            start: First timestamp in nanoseconds (default: beginning)
+            end: Stop before this timestamp (default: end of recording)
+            channels: Only these channel names (default: all)
+        """
+        wanted = None
+        if channels is not None:
+            wanted = {cid for cid, name in self.channelNames.items() if name in channels}
+        seg, i = self.seek(start) if start is not None else (0, 0)
+        while seg < len(self.segments):
+            segment = self.segments[seg]
+            while i < segment.count:
+                timestamp, channelId, encoding, data = segment.read(i)
+                i += 1
+                if end is not None and timestamp >= end:
+                    return
+                if wanted is not None and channelId not in wanted:
+                    continue
+                payload = json.loads(data) if encoding == ENCODING_JSON else data
+                yield Record(timestamp, self.channelNames.get(channelId, str(channelId)), payload)
+            seg, i = seg + 1, 0
+
+    def replay(self, start: Optional[int] = None, end: Optional[int] = None,
+               channels: Optional[Sequence[str]] = None, speed: Optional[float] = 1.0) -> Iterator[Record]:
+        """
+        Like read(), but paced by the recorded timestamps
+
+        Args:
+            speed: Playback rate, 2.0 replays twice as fast; None or 0 replays
+                   without waiting (fast-forward)
+        """
+        origin = None
+        for record in self.read(start, end, channels):
+            if speed:
+                if origin is None:
+                    origin = (record.timestamp, time.monotonic())
+                due = origin[1] + (record.timestamp - origin[0]) / 1e9 / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield record
+
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+def _listSegments(directory: str) -> List[str]:
+    return sorted(name[:-4] for name in os.listdir(directory)
+                  if name.startswith("seg-") and name.endswith(".dat"))
+
+
+def _segmentBytes(directory: str, name: str) -> int:
+    total = 0
+    for ext in (".dat", ".idx"):
+        try:
+            total += os.path.getsize(os.path.join(directory, name + ext))
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def _loadChannels(directory: str) -> Dict[str, int]:
+    try:
+        with open(os.path.join(directory, CHANNELS_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _saveChannels(directory: str, channels: Dict[str, int]) -> None:
+    path = os.path.join(directory, CHANNELS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(channels, f)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,275 @@
+"""
+RPC - Request/reply on top of Messenger using DEALER/ROUTER sockets
+Supports many outstanding requests, per-call deadlines and a worker pool
+"""
+import time
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional, Tuple
+
+import zmq
+
+from .messenger import Messenger
+
+
+class RPCError(RuntimeError):
+    """Raised on the client when the remote handler failed"""
+
+
+class _Pipe:
+    """
+    Thread-safe hand-off of outgoing frames to the socket owning thread
+
+    ZMQ sockets must not be shared between threads, so callers push frames
+    into an inproc PUSH socket under a lock and the I/O thread forwards them.
+    """
+
+    def __init__(self, context: zmq.Context, name: str):
+        self.endpoint = f"inproc://acp-rpc-{name}"
+        self.pull = context.socket(zmq.PULL)
+        self.pull.bind(self.endpoint)
+        self.push = context.socket(zmq.PUSH)
+        self.push.connect(self.endpoint)
+        self.lock = threading.Lock()
+
+    def send(self, frames: list) -> None:
+        with self.lock:
+            self.push.send_multipart(frames)
+
+    def close(self) -> None:
+        self.push.close(linger=0)
+        self.pull.close(linger=0)
+
+
+class RPCClient(Messenger):
+    """
+    DEALER-based RPC client
+
+    Requests carry an ID so replies can arrive in any order, and each call
+    has its own deadline so a lost reply never wedges the socket.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.defaultTimeout: float = 1.0
+        self.pending: Dict[int, Tuple[Future, float]] = {}
+        self.pendingLock = threading.Lock()
+        self.requestIds = itertools.count(1)
+        self.pipe: Optional[_Pipe] = None
+        self.ioThread: Optional[threading.Thread] = None
+        self.running: bool = False
+
+    def configure(self, configuration: Dict[str, Any]) -> None:
+        """
+        Configure the client
+
+        Args:
+            configuration: Messenger options plus:
+                - timeoutMs: Default call deadline in milliseconds (default: 1000)
+        """
+        super().configure(dict(configuration, socketType="DEALER"))
+        self.defaultTimeout = self.config.get("timeoutMs", 1000) / 1000.0
+
+    def connect(self) -> None:
+        super().connect()
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.pipe = _Pipe(self.context, str(id(self)))
+        self.running = True
+        self.ioThread = threading.Thread(target=self._ioLoop, daemon=True)
+        self.ioThread.start()
+
+    def disconnect(self) -> None:
+        if not self.connected:
+            return
+        self.running = False
+        if self.ioThread is not None:
+            self.ioThread.join(timeout=1.0)
+        self._failPending(ConnectionError("Disconnected"))
+        if self.pipe is not None:
+            self.pipe.close()
+            self.pipe = None
+        super().disconnect()
+
+    def callAsync(self, method: str, params: Optional[Dict[str, Any]] = None,
+                  timeout: Optional[float] = None) -> Future:
+        """
+        Send a request without waiting for the reply
+
+        Args:
+            method: Remote method name
+            params: Keyword parameters for the remote handler
+            timeout: Deadline in seconds (default: configured timeoutMs)
+
+        Returns:
+            Future: Resolves to the result, or raises TimeoutError/RPCError
+        """
+        if not self.connected:
+            raise RuntimeError("Not connected")
+
+        timeout = self.defaultTimeout if timeout is None else timeout
+        request_id = next(self.requestIds)
+        future: Future = Future()
+        with self.pendingLock:
+            self.pending[request_id] = (future, time.monotonic() + timeout)
+
+        self.pipe.send([self.serialize({
+            "id": request_id,
+            "method": method,
+            "params": params or {},
+            "timeoutMs": int(timeout * 1000)
+        })])
+        return future
+
+    def call(self, method: str, params: Optional[Dict[str, Any]] = None,
+             timeout: Optional[float] = None) -> Any:
+        """Send a request and block until the reply or the deadline"""
+        return self.callAsync(method, params, timeout).result()
+
+    def _ioLoop(self) -> None:
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        poller.register(self.pipe.pull, zmq.POLLIN)
+
+        while self.running:
+            try:
+                events = dict(poller.poll(self._pollTimeout()))
+                if self.pipe.pull in events:
+                    self.socket.send_multipart(self.pipe.pull.recv_multipart())
+                if self.socket in events:
+                    self._resolve(self.deserialize(self.socket.recv()))
+                self._expire()
+            except Exception as e:
+                if self.running:
+                    print("Error in RPC client:", e)
+
+    def _pollTimeout(self) -> int:
+        """Sleep until the nearest deadline, capped so shutdown stays responsive"""
+        with self.pendingLock:
+            if not self.pending:
+                return 100
+            nearest = min(deadline for _, deadline in self.pending.values())
+        return max(0, min(100, int((nearest - time.monotonic()) * 1000) + 1))
+
+    def _resolve(self, reply: dict) -> None:
+        with self.pendingLock:
+            entry = self.pending.pop(reply.get("id"), None)
+        if entry is None:
+            # Late reply for a request that already timed out
+            return
+        future = entry[0]
+        if "error" in reply:
+            future.set_exception(RPCError(reply["error"]))
+        else:
+            future.set_result(reply.get("result"))
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self.pendingLock:
+            expired = [rid for rid, (_, deadline) in self.pending.items() if deadline <= now]
+            futures = [self.pending.pop(rid)[0] for rid in expired]
+        for future in futures:
+            future.set_exception(TimeoutError("RPC deadline exceeded"))
+
+    def _failPending(self, error: Exception) -> None:
+        with self.pendingLock:
+            futures = [future for future, _ in self.pending.values()]
+            self.pending.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+
+class RPCServer(Messenger):
+    """
+    ROUTER-based RPC server dispatching requests to a worker pool
+
+    Handlers receive the request params as keyword arguments and return a
+    BSON-serializable result. Requests already past their deadline when a
+    worker picks them up are dropped, since the client has given up.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.handlers: Dict[str, Callable[..., Any]] = {}
+        self.workers: int = 4
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.pipe: Optional[_Pipe] = None
+        self.ioThread: Optional[threading.Thread] = None
+        self.running: bool = False
+
+    def configure(self, configuration: Dict[str, Any]) -> None:
+        """
+        Configure the server
+
+        Args:
+            configuration: Messenger options plus:
+                - workers: Size of the handler thread pool (default: 4)
+        """
+        super().configure(dict(configuration, socketType="ROUTER"))
+        self.config.setdefault("bind", True)
+        self.workers = self.config.get("workers", 4)
+
+    def register(self, method: str, handler: Callable[..., Any]) -> None:
+        """Register a handler for a method name"""
+        self.handlers[method] = handler
+
+    def connect(self) -> None:
+        super().connect()
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.pipe = _Pipe(self.context, str(id(self)))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.running = True
+        self.ioThread = threading.Thread(target=self._ioLoop, daemon=True)
+        self.ioThread.start()
+
+    def disconnect(self) -> None:
+        if not self.connected:
+            return
+        self.running = False
+        if self.ioThread is not None:
+            self.ioThread.join(timeout=1.0)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.pipe is not None:
+            self.pipe.close()
+            self.pipe = None
+        super().disconnect()
+
+    def _ioLoop(self) -> None:
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        poller.register(self.pipe.pull, zmq.POLLIN)
+
+        while self.running:
+            try:
+                events = dict(poller.poll(100))
+                if self.pipe.pull in events:
+                    self.socket.send_multipart(self.pipe.pull.recv_multipart())
+                if self.socket in events:
+                    identity, payload = self.socket.recv_multipart()
+                    request = self.deserialize(payload)
+                    # Client and server clocks differ, so deadlines travel as durations
+                    deadline = time.monotonic() + request.get("timeoutMs", 0) / 1000.0
+                    self.executor.submit(self._handle, identity, request, deadline)
+            except Exception as e:
+                if self.running:
+                    print("Error in RPC server:", e)
+
+    def _handle(self, identity: bytes, request: dict, deadline: float) -> None:
+        if request.get("timeoutMs") and time.monotonic() > deadline:
+            return
+
+        reply: Dict[str, Any] = {"id": request.get("id")}
+        handler = self.handlers.get(request.get("method"))
+        if handler is None:
+            reply["error"] = f"Unknown method: {request.get('method')}"
+        else:
+            try:
+                reply["result"] = handler(**request.get("params", {}))
+            except Exception as e:
+                reply["error"] = f"{type(e).__name__}: {e}"
+
+        if self.running:
+            self.pipe.send([identity, self.serialize(reply)])
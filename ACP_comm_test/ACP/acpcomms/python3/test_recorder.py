@@ -0,0 +1,82 @@
+"""
+Recorder retention tests
+
+Run with: python -m pytest ACP_comm_test/ACP/acpcomms/python3/test_recorder.py
+"""
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from ACP.acpcomms.python3.recorder import Recorder, RecordingReader, _listSegments, _segmentBytes
+
+
+def _recordedBytes(directory: str) -> int:
+    return sum(_segmentBytes(directory, name) for name in _listSegments(directory))
+
+
+class _MeasuringRecorder(Recorder):
+    """Samples the directory size from the writer thread, where it cannot race"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.peak = 0
+
+    def _measure(self) -> None:
+        self.peak = max(self.peak, _recordedBytes(self.directory))
+
+    def _writeBlock(self, block, index):
+        super()._writeBlock(block, index)
+        self._measure()
+
+    def _openSegment(self, startNs):
+        self._measure()
+        super()._openSegment(startNs)
+
+
+def test_directory_never_exceeds_max_bytes():
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = _MeasuringRecorder(directory, segmentBytes=20000, maxBytes=100000,
+                                      blockBytes=16384, flushInterval=0.01)
+        recorder.start()
+        timestamp = 0
+        try:
+            for _ in range(3000):
+                timestamp += 1000
+                recorder.record("video", os.urandom(rng.randint(1, 6000)), timestamp)
+        finally:
+            recorder.close()
+
+        assert 0 < recorder.peak <= 100000
+        assert _recordedBytes(directory) <= 100000
+        for name in _listSegments(directory):
+            assert _segmentBytes(directory, name) <= 20000
+
+        # whatever survived retention is still a contiguous tail of the recording
+        with RecordingReader(directory) as reader:
+            stamps = [record.timestamp for record in reader.read()]
+        assert stamps and stamps[-1] == timestamp
+        assert stamps == list(range(stamps[0], timestamp + 1, 1000))
+
+
+def test_equal_timestamps_across_rollover():
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = Recorder(directory, segmentBytes=4096, maxBytes=1 << 20,
+                            blockBytes=1 << 20, flushInterval=10.0)
+        recorder.start()
+        for i in range(100):
+            recorder.record("telemetry", i.to_bytes(4, "little") * 100, 5)
+        recorder.close()
+
+        with RecordingReader(directory) as reader:
+            payloads = [int.from_bytes(record.data[:4], "little") for record in reader.read(start=5)]
+        assert payloads == list(range(100))
+
+
+if __name__ == "__main__":
+    test_directory_never_exceeds_max_bytes()
+    test_equal_timestamps_across_rollover()
+    print("ok")
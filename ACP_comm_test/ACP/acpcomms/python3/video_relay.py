@@ -0,0 +1,595 @@
+"""
+VideoRelay - asyncio UDP-to-HTTP video relay
+Ingests chunked JPEG frames over UDP and serves them as MJPEG over HTTP and
+as binary WebSocket messages, all from one event loop
+"""
+import asyncio
+import base64
+import hashlib
+import html
+import json
+import socket
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .frame_broadcaster import MJPEG_BOUNDARY, MJPEG_HEADER
+
+try:
+    import cv2
+    import numpy as np
+    from .jpeg_encoder import JpegEncoder
+except ImportError:
+    # renditions need OpenCV; the relay itself does not
+    cv2 = None
+
+
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC11B85"
+
+# WebSocket opcodes
+WS_BINARY = 0x2
+WS_CLOSE = 0x8
+WS_PING = 0x9
+WS_PONG = 0xA
+
+# Largest control frame a client may send; video only flows server to client
+WS_MAX_CLIENT_PAYLOAD = 1 << 16
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+
+# IMREAD_REDUCED_* decodes at 1/2, 1/4 or 1/8 scale for little more than the entropy decode
+REDUCED_DECODE = ((8, "IMREAD_REDUCED_COLOR_8"), (4, "IMREAD_REDUCED_COLOR_4"),
+                  (2, "IMREAD_REDUCED_COLOR_2"))
+
+
+class VideoStream:
+    """
+    Latest frame of one video source
+
+    Every publish() replaces the frame and wakes all waiting clients. A
+    client that is still writing the previous frame picks up whatever is
+    newest when it comes back, so slow clients skip frames.
+    """
+
+    def __init__(self, streamId: str = "default", sender: str = ""):
+        self.streamId = streamId
+        self.sender = sender
+        self.seq = 0
+        self.data: Optional[bytes] = None
+        self.part: Optional[bytes] = None
+        self.stamp = 0.0
+        self.lastActive = time.monotonic()
+        self.viewers = 0
+        self.closed = False
+        self.changed = asyncio.Event()
+
+        # downscaled copies, created on first request
+        self.renditions: Dict[str, "Rendition"] = {}
+        self.rendering = False
+        self.sourceSize: Optional[Tuple[int, int]] = None
+
+    def publish(self, data: bytes, stamp: Optional[float] = None) -> int:
+        """Make data the latest frame; must be called from the event loop thread"""
+        self.seq += 1
+        self.data = data
+        self.part = MJPEG_HEADER + data + b"\r\n"
+        self.stamp = time.time() if stamp is None else stamp
+        self.lastActive = time.monotonic()
+        self._wake()
+        return self.seq
+
+    def memoryBytes(self) -> int:
+        """Bytes held for the latest frame and its renditions"""
+        own = (len(self.data) if self.data else 0) + (len(self.part) if self.part else 0)
+        return own + sum(rendition.memoryBytes() for rendition in self.renditions.values())
+
+    def info(self) -> Dict:
+        return {
+            "id": self.streamId,
+            "sender": self.sender,
+            "frames": self.seq,
+            "idle": round(time.monotonic() - self.lastActive, 3),
+            "frameBytes": len(self.data) if self.data else 0,
+            "memoryBytes": self.memoryBytes(),
+            "viewers": self.viewers,
+            "renditions": {name: rendition.viewers for name, rendition in self.renditions.items()},
+        }
+
+    async def next(self, lastSeq: int) -> int:
+        """
+        Wait for a frame newer than lastSeq
+
+        Returns:
+            int: Sequence number of the newest frame, 0 once the stream is closed
+        """
+        while self.seq <= lastSeq and not self.closed:
+            await self.changed.wait()
+        return 0 if self.closed else self.seq
+
+    def close(self):
+        self.closed = True
+        for rendition in self.renditions.values():
+            rendition.close()
+        self._wake()
+
+    def _wake(self):
+        # waiters hold the old event; a fresh one is armed for the next frame
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class Rendition(VideoStream):
+    """
+    Downscaled copy of a VideoStream
+
+    Frames are derived from the parent's frames, at most once per parent
+    frame and only while the rendition has viewers. sourceSeq is the parent
+    frame the current data was made from.
+    """
+
+    def __init__(self, parent: VideoStream, size: Tuple[int, int]):
+        self.size = size
+        self.name = f"{size[0]}x{size[1]}"
+        super().__init__(f"{parent.streamId}/{self.name}", parent.sender)
+        self.parent = parent
+        self.sourceSeq = 0
+
+    def memoryBytes(self) -> int:
+        return (len(self.data) if self.data else 0) + (len(self.part) if self.part else 0)
+
+
+class _Reassembly:
+    """Chunks of the frame one sender is in the middle of"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.lastActive = time.monotonic()
+
+
+class _UdpIngest(asyncio.DatagramProtocol):
+    def __init__(self, relay: "VideoRelay"):
+        self.relay = relay
+
+    def datagram_received(self, packet: bytes, addr: Tuple[str, int]):
+        self.relay._ingestDatagram(packet, addr)
+
+    def error_received(self, exc: Exception):
+        print(f"UDP ingest error: {exc}")
+
+
+class VideoRelay:
+    """
+    UDP video ingest plus MJPEG and WebSocket fan-out on a single event loop
+
+    Datagrams are JPEG chunks followed by a big-endian CRC32 of the chunk,
+    as sent by Streamer.sendChunkWithChecksum(); a frame is complete when the
+    reassembled buffer ends with the JPEG end-of-image marker. Each viewer is
+    a coroutine rather than a thread. Viewers wait on the stream for a new
+    frame and then for their own socket to drain, which bounds the memory a
+    slow viewer can hold to about one frame and makes it skip frames instead.
+
+    Every sender gets its own stream in a table keyed by stream ID: the
+    name given in streamNames for "ip:port" or "ip", else "ip:port", so two
+    cameras on one host stay apart unless an "ip" entry merges them.
+    Streams that send nothing for idleTimeout seconds are dropped, and a
+    frame larger than maxFrameBytes is discarded while it is reassembled.
+
+    Routes:
+        videoPath                   MJPEG stream of the default stream
+        videoPath/<id>              MJPEG stream of one stream
+        videoPath/<id>/<W>x<H>      MJPEG stream of a downscaled rendition
+        /ws, /ws/<id>[/<W>x<H>]     WebSocket, one binary message per JPEG frame
+        /streams                    JSON list of the live streams
+        /                           Minimal page showing every stream
+    """
+
+    def __init__(self, udpPort: int, httpPort: int, host: str = "0.0.0.0",
+                 videoPath: str = "/video", maxFps: Optional[float] = None,
+                 chunkSize: int = 65000,
+                 datagramHook: Optional[Callable[[bytes], bool]] = None,
+                 streamNames: Optional[Dict[str, str]] = None,
+                 defaultStream: Optional[str] = None,
+                 idleTimeout: float = 10.0,
+                 maxFrameBytes: int = 4 * 1024 * 1024,
+                 maxStreams: int = 32,
+                 renditions: Sequence[Tuple[int, int]] = ((160, 120), (320, 240)),
+                 renditionQuality: int = 70):
+        """
+        Args:
+            udpPort: UDP port frames arrive on
+            httpPort: HTTP port for viewers
+            host: Address both sockets bind to (default: "0.0.0.0")
+            videoPath: URL path of the MJPEG stream (default: "/video")
+            maxFps: Upper bound on frames per second sent to each viewer
+                    (default: None, every frame)
+            chunkSize: Largest JPEG chunk per datagram, excluding the checksum
+            datagramHook: Called with every datagram first; returning True
+                          marks it as handled (e.g. metadata) so it is not
+                          treated as video
+            streamNames: Stream ID per sender, keyed by "ip:port" or "ip"
+                         (default: the sender's "ip:port")
+            defaultStream: Stream served on videoPath and /ws
+                           (default: the oldest live stream)
+            idleTimeout: Seconds without a frame before a stream is dropped
+            maxFrameBytes: Largest JPEG frame accepted per stream
+            maxStreams: Largest number of streams kept at once
+            renditions: Sizes (width, height) of the downscaled renditions
+                        served on videoPath/<id>/<W>x<H> and /ws/<id>/<W>x<H>
+            renditionQuality: JPEG quality of the renditions
+        """
+        self.udpPort = udpPort
+        self.httpPort = httpPort
+        self.host = host
+        self.videoPath = videoPath
+        self.minInterval = 1.0 / maxFps if maxFps else 0.0
+        self.chunkSize = chunkSize
+        self.datagramHook = datagramHook
+        self.streamNames = dict(streamNames or {})
+        self.defaultStream = defaultStream
+        self.idleTimeout = idleTimeout
+        self.maxFrameBytes = maxFrameBytes
+        self.maxStreams = maxStreams
+        self.renditionSizes = {f"{w}x{h}": (w, h) for w, h in renditions} if cv2 is not None else {}
+        self.renditionEncoder = JpegEncoder(quality=renditionQuality) if self.renditionSizes else None
+
+        self.streams: Dict[str, VideoStream] = {}
+        self.streamAdded: Optional[asyncio.Event] = None
+        self.buffers: Dict[Tuple[str, int], _Reassembly] = {}
+        self.viewers = 0
+        self.packetsReceived = 0
+        self.packetsBadChecksum = 0
+        self.framesDropped = 0
+
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def run(self) -> None:
+        """Serve until interrupted"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self) -> None:
+        """Bind the UDP and HTTP sockets and serve until cancelled"""
+        self.streamAdded = asyncio.Event()
+        await self.openIngest()
+
+        self.server = await asyncio.start_server(self._handleClient, self.host, self.httpPort)
+        print(f"Video relay: UDP {self.host}:{self.udpPort} -> HTTP {self.host}:{self.httpPort}")
+        evictor = asyncio.ensure_future(self._evictIdle())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            evictor.cancel()
+            for stream in self.streams.values():
+                stream.close()
+            self.streams.clear()
+            self.transport.close()
+
+    # ---------------- UDP INGEST ----------------
+
+    async def openIngest(self) -> None:
+        """
+        Bind the UDP socket, replacing a previous one (e.g. after a socket error)
+
+        Raises:
+            OSError: If the port cannot be bound
+        """
+        if self.transport is not None:
+            self.transport.close()
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _UdpIngest(self), local_addr=(self.host, self.udpPort))
+        sock = self.transport.get_extra_info("socket")
+        try:
+            # room for a few whole frames while the loop is busy writing to viewers
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+
+    def _ingestDatagram(self, packet: bytes, addr: Tuple[str, int]) -> None:
+        if self.datagramHook is not None and self.datagramHook(packet):
+            return
+        self.packetsReceived += 1
+        if len(packet) < 4 or len(packet) > self.chunkSize + 4:
+            self.packetsBadChecksum += 1
+            return
+
+        chunk = memoryview(packet)[:-4]
+        if zlib.crc32(chunk) != int.from_bytes(packet[-4:], "big"):
+            # a lost or corrupt chunk spoils the frame being assembled
+            self.packetsBadChecksum += 1
+            self.buffers.pop(addr, None)
+            return
+
+        assembly = self.buffers.get(addr)
+        if assembly is None:
+            assembly = self.buffers[addr] = _Reassembly()
+        buffer = assembly.data
+        if len(buffer) + len(chunk) > self.maxFrameBytes:
+            # no end marker in sight: drop the frame instead of growing without bound
+            self.framesDropped += 1
+            del self.buffers[addr]
+            return
+        buffer += chunk
+        assembly.lastActive = time.monotonic()
+
+        if buffer.endswith(JPEG_EOI):
+            del self.buffers[addr]
+            if buffer.startswith(JPEG_SOI):
+                self.publish(bytes(buffer), self.streamIdFor(addr), f"{addr[0]}:{addr[1]}")
+
+    def streamIdFor(self, addr: Tuple[str, int]) -> str:
+        """Stream ID of a sender address"""
+        ip, port = addr[0], addr[1]
+        sender = f"{ip}:{port}"
+        return self.streamNames.get(sender) or self.streamNames.get(ip) or sender
+
+    def publish(self, data: bytes, streamId: str = "default", sender: str = "") -> int:
+        """
+        Publish a complete JPEG frame to every viewer of a stream
+
+        Returns:
+            int: Sequence number of the frame, 0 if it was dropped
+        """
+        stream = self.streams.get(streamId)
+        if stream is None:
+            if len(self.streams) >= self.maxStreams or len(data) > self.maxFrameBytes:
+                self.framesDropped += 1
+                return 0
+            stream = self.streams[streamId] = VideoStream(streamId, sender)
+            print(f"Video relay: new stream '{streamId}' from {sender or 'local'}")
+            self.streamAdded.set()
+            self.streamAdded = asyncio.Event()
+        elif len(data) > self.maxFrameBytes:
+            self.framesDropped += 1
+            return 0
+        stream.sender = sender or stream.sender
+        seq = stream.publish(data)
+        if stream.renditions:
+            self._refreshRenditions(stream)
+        return seq
+
+    def rendition(self, stream: VideoStream, name: str) -> Optional[Rendition]:
+        """The named rendition of stream, None if no such size is configured"""
+        rendition = stream.renditions.get(name)
+        if rendition is None and name in self.renditionSizes:
+            rendition = stream.renditions[name] = Rendition(stream, self.renditionSizes[name])
+        return rendition
+
+    def _refreshRenditions(self, stream: VideoStream) -> None:
+        """Render the newest frame for every watched, outdated rendition, one job at a time"""
+        if stream.rendering or stream.closed or stream.data is None:
+            return
+        active = [r for r in stream.renditions.values() if r.viewers and r.sourceSeq != stream.seq]
+        if not active:
+            return
+        stream.rendering = True
+        seq, data = stream.seq, stream.data
+        # decode and resize off the event loop; cv2 releases the GIL
+        job = asyncio.get_running_loop().run_in_executor(
+            None, self._render, data, stream.sourceSize, [r.size for r in active])
+        job.add_done_callback(lambda job: self._renditionsDone(stream, seq, active, job))
+
+    def _render(self, data: bytes, sourceSize: Optional[Tuple[int, int]],
+                sizes: List[Tuple[int, int]]) -> Optional[Tuple[Tuple[int, int], List[bytes]]]:
+        # decode once, as small as the largest requested size allows
+        width = max(w for w, _ in sizes)
+        height = max(h for _, h in sizes)
+        factor, flag = 1, cv2.IMREAD_COLOR
+        if sourceSize is not None:
+            for f, name in REDUCED_DECODE:
+                if sourceSize[0] // f >= width and sourceSize[1] // f >= height and hasattr(cv2, name):
+                    factor, flag = f, getattr(cv2, name)
+                    break
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        if img is None:
+            return None
+        jpegs = [self.renditionEncoder.encode(cv2.resize(img, size, interpolation=cv2.INTER_AREA))
+                 for size in sizes]
+        return (img.shape[1] * factor, img.shape[0] * factor), jpegs
+
+    def _renditionsDone(self, stream: VideoStream, seq: int, active: List[Rendition], job) -> None:
+        stream.rendering = False
+        try:
+            result = job.result()
+        except Exception as e:
+            print(f"Rendition error for stream '{stream.streamId}': {e}")
+            result = None
+        if result is not None:
+            stream.sourceSize, jpegs = result
+            for rendition, jpeg in zip(active, jpegs):
+                rendition.sourceSeq = seq
+                rendition.publish(jpeg)
+        else:
+            # undecodable frame: skip it rather than retrying
+            for rendition in active:
+                rendition.sourceSeq = seq
+        # frames published meanwhile
+        self._refreshRenditions(stream)
+
+    def streamList(self) -> List[Dict]:
+        return [stream.info() for stream in self.streams.values()]
+
+    async def _defaultStream(self) -> VideoStream:
+        """The configured default stream, else the oldest one; waits until it exists"""
+        while True:
+            if self.defaultStream is not None:
+                stream = self.streams.get(self.defaultStream)
+            else:
+                stream = next(iter(self.streams.values()), None)
+            if stream is not None:
+                return stream
+            await self.streamAdded.wait()
+
+    async def _evictIdle(self) -> None:
+        while True:
+            await asyncio.sleep(min(1.0, self.idleTimeout / 2))
+            now = time.monotonic()
+            for streamId, stream in list(self.streams.items()):
+                if now - stream.lastActive > self.idleTimeout:
+                    print(f"Video relay: stream '{streamId}' idle, dropped")
+                    # ends the stream's viewers; they reconnect to a live one
+                    stream.close()
+                    del self.streams[streamId]
+            for addr, assembly in list(self.buffers.items()):
+                if now - assembly.lastActive > self.idleTimeout:
+                    del self.buffers[addr]
+
+    # ---------------- HTTP ----------------
+
+    async def _handleClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            method, path, headers = self._parseRequest(head)
+            if method != "GET":
+                await self._respond(writer, "405 Method Not Allowed", b"")
+            elif path == self.videoPath:
+                await self._serveMjpeg(writer, await self._defaultStream())
+            elif path.startswith(self.videoPath + "/"):
+                stream = self._lookup(path[len(self.videoPath) + 1:])
+                if stream is None:
+                    await self._respond(writer, "404 Not Found", b"Unknown stream")
+                else:
+                    await self._serveMjpeg(writer, stream)
+            elif (path == "/ws" or path.startswith("/ws/")) and headers.get("upgrade", "").lower() == "websocket":
+                if path == "/ws":
+                    stream = await self._defaultStream()
+                else:
+                    stream = self._lookup(path[4:])
+                if stream is None:
+                    await self._respond(writer, "404 Not Found", b"Unknown stream")
+                else:
+                    await self._serveWebSocket(reader, writer, headers, stream)
+            elif path == "/streams":
+                body = json.dumps(self.streamList()).encode()
+                await self._respond(writer, "200 OK", body, "application/json")
+            elif path == "/":
+                page = "<h2>Camera Streams</h2>" + "".join(
+                    f'<h3>{html.escape(stream.streamId)}</h3>'
+                    f'<img src="{self.videoPath}/{html.escape(stream.streamId, quote=True)}">'
+                    for stream in self.streams.values())
+                await self._respond(writer, "200 OK", page.encode(), "text/html; charset=utf-8")
+            else:
+                await self._respond(writer, "404 Not Found", b"")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _lookup(self, name: str) -> Optional[VideoStream]:
+        """Stream for <id>, or its rendition for <id>/<W>x<H>"""
+        streamId, _, renditionName = name.partition("/")
+        stream = self.streams.get(streamId)
+        if stream is None or not renditionName:
+            return stream
+        return self.rendition(stream, renditionName)
+
+    @staticmethod
+    def _parseRequest(head: bytes) -> Tuple[str, str, Dict[str, str]]:
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        method = parts[0] if parts else ""
+        path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return method, path, headers
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: str, body: bytes,
+                       contentType: str = "text/plain") -> None:
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {contentType}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _serveMjpeg(self, writer: asyncio.StreamWriter, stream: VideoStream) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: multipart/x-mixed-replace; boundary=" + MJPEG_BOUNDARY.encode() + b"\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        await self._fanOut(writer, stream, lambda stream: (stream.part,))
+
+    async def _serveWebSocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                              headers: Dict[str, str], stream: VideoStream) -> None:
+        key = headers.get("sec-websocket-key")
+        if not key:
+            await self._respond(writer, "400 Bad Request", b"")
+            return
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+
+        sender = asyncio.ensure_future(
+            self._fanOut(writer, stream, lambda stream: (_wsHeader(WS_BINARY, len(stream.data)), stream.data)))
+        receiver = asyncio.ensure_future(self._wsReceive(reader, writer))
+        try:
+            await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (sender, receiver):
+                task.cancel()
+            await asyncio.gather(sender, receiver, return_exceptions=True)
+
+    async def _fanOut(self, writer: asyncio.StreamWriter, stream: VideoStream, pieces) -> None:
+        """Send the newest frame, as pieces(stream), every time one is published"""
+        self.viewers += 1
+        stream.viewers += 1
+        if isinstance(stream, Rendition):
+            # render the current frame now instead of waiting for the next one
+            self._refreshRenditions(stream.parent)
+        try:
+            seq = 0
+            while True:
+                seq = await stream.next(seq)
+                if not seq:
+                    return
+                for piece in pieces(stream):
+                    writer.write(piece)
+                # backpressure: wait for this viewer's socket, not for the others
+                await writer.drain()
+                if self.minInterval:
+                    await asyncio.sleep(self.minInterval)
+        finally:
+            self.viewers -= 1
+            stream.viewers -= 1
+
+    async def _wsReceive(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer pings and the closing handshake; anything else from the client is ignored"""
+        while True:
+            b1, b2 = await reader.readexactly(2)
+            opcode = b1 & 0x0F
+            length = b2 & 0x7F
+            if length == 126:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+            elif length == 127:
+                length = int.from_bytes(await reader.readexactly(8), "big")
+            if length > WS_MAX_CLIENT_PAYLOAD:
+                writer.write(_wsHeader(WS_CLOSE, 2) + (1009).to_bytes(2, "big"))
+                return
+            mask = await reader.readexactly(4) if b2 & 0x80 else None
+            payload = await reader.readexactly(length)
+            if mask is not None:
+                payload = bytes(b ^ mask[i & 3] for i, b in enumerate(payload))
+
+            if opcode == WS_CLOSE:
+                writer.write(_wsHeader(WS_CLOSE, len(payload[:2])) + payload[:2])
+                await writer.drain()
+                return
+            if opcode == WS_PING:
+                writer.write(_wsHeader(WS_PONG, len(payload)) + payload)
+
+
+def _wsHeader(opcode: int, length: int) -> bytes:
+    """Header of a final, unmasked server-to-client WebSocket frame"""
+    if length < 126:
+        return bytes((0x80 | opcode, length))
+    if length < 1 << 16:
+        return bytes((0x80 | opcode, 126)) + length.to_bytes(2, "big")
+    return bytes((0x80 | opcode, 127)) + length.to_bytes(8, "big")
@@ -5,58 +5,48 @@ Receives UDP packets, validates checksum, and streams frames over HTTP.
 After 15 seconds of streaming, simulates a socket failure and then
 recovers using retry logic.
 '''
-from flask import Flask, Response
-import socket
-import cv2
-import numpy as np
-import threading
-import zlib
-import time
+import asyncio
 import random
+import sys
 from datetime import datetime
-from typing import Iterator, Generator, Tuple, Any, Optional
+from pathlib import Path
+from typing import Generator, Optional
+
+sys.path.append(str(Path(__file__).resolve().parents[4]))
+from ACP.acpcomms.python3.video_relay import VideoRelay
 
 class VideoStreamingServer:
     """
     Server implementation for receiving a video stream via UDP (or simulated UDP)
-    and re-streaming it to a client over HTTP using Flask.
+    and re-streaming it to clients over HTTP using VideoRelay.
 
+    Every viewer is a coroutine on the relay's event loop rather than a thread.
     Includes robust features like checksum validation and exponential backoff
     for connection recovery.
     """
 
-    def __init__(self, udp_ip: str = "0.0.0.0", udp_port: int = 5005, http_port: int = 8000, simulate_failure_after: int = 15):
+    def __init__(self, udp_ip: str = "0.0.0.0", udp_port: int = 5005, http_port: int = 8000, simulate_failure_after: int = 15,
+                 max_client_fps: Optional[float] = 30):
         """
         Initialize the streaming server instance.
 
-        :param udp_ip: The IP address the UDP listener will bind to.
+        :param udp_ip: The IP address the UDP and HTTP sockets will bind to.
         :param udp_port: The UDP port number to listen on for incoming video packets.
-        :param http_port: The HTTP port number for the Flask server to run on.
+        :param http_port: The HTTP port number viewers connect to.
         :param simulate_failure_after: Time in seconds after which a socket failure is simulated.
+        :param max_client_fps: Upper bound on frames per second sent to each HTTP client, None for no limit.
         """
         # Configuration
         self.UDP_IP = udp_ip
         self.UDP_PORT = udp_port
         self.HTTP_PORT = http_port
-        self.BUFFER_SIZE = 65536 # Max packet size
         self.simulate_failure_after = simulate_failure_after
+        self.max_client_fps = max_client_fps
 
-        # State management
-        self.frame_data: bytes = b''
-        self.frame_lock: threading.Lock = threading.Lock()
-        self.failure_triggered: bool = False
-        self.start_time: float = time.time()
-
-        # Application setup
-        self.app = Flask(__name__)
-        self._setup_routes()
-
-    def _setup_routes(self):
-        """
-        Registers the class methods as Flask routes.
-        """
-        self.app.add_url_rule('/', 'index', self.index)
-        self.app.add_url_rule('/video_feed', 'video_feed', self.video_feed)
+        # Reassembly, checksum validation and the MJPEG/WebSocket routes live in the relay;
+        # the stream keeps its old URL, /video_feed
+        self.relay = VideoRelay(udp_port, http_port, host=udp_ip,
+                                videoPath='/video_feed', maxFps=max_client_fps)
 
     def _exponential_backoff_with_jitter(self, base: float = 1.0, max_attempts: int = 5) -> Generator[float, None, None]:
         """
@@ -71,158 +61,68 @@ class VideoStreamingServer:
             jitter = random.uniform(0, delay * 0.5)
             yield delay + jitter
 
-    def _udp_listener(self) -> None:
-        """
-        Listens for UDP packets on the configured port, validates checksum,
-        and assembles the video frame.
-
-        This function runs indefinitely in a thread and updates self.frame_data.
-        It raises a ConnectionError after 'simulate_failure_after' seconds to
-        trigger the retry logic.
-
-        :raises ConnectionError: On simulated socket failure, for testing recovery.
-        """
-        sock: Optional[socket.socket] = None
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.bind((self.UDP_IP, self.UDP_PORT))
-            buffer = b''
-
-            last_report_time = time.time()
-            packets_received = 0
-            packets_bad_checksum = 0
-
-            print(f"UDP Listener started on {self.UDP_IP}:{self.UDP_PORT}")
-
-            while True:
-                # Simulate failure check
-                if not self.failure_triggered and time.time() - self.start_time >= self.simulate_failure_after:
-                    print("Simulating UDP listener failure...")
-                    sock.close()
-                    self.failure_triggered = True
-                    raise ConnectionError("Simulated socket failure")
-
-                packet, _ = sock.recvfrom(self.BUFFER_SIZE)
-
-                if len(packet) < 4:
-                    packets_bad_checksum += 1
-                    continue
-
-                # Checksum validation
-                chunk = packet[:-4]
-                recv_checksum = int.from_bytes(packet[-4:], byteorder='big')
-                calc_checksum = zlib.crc32(chunk)
-
-                packets_received += 1
-                if recv_checksum != calc_checksum:
-                    packets_bad_checksum += 1
-                else:
-                    buffer += chunk
-                    # Try to decode the image from the buffer
-                    img = cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), cv2.IMREAD_COLOR)
-
-                    if img is not None:
-                        # Frame successfully decoded, encode to JPEG for streaming
-                        ret, jpeg = cv2.imencode('.jpg', img)
-                        if ret:
-                            with self.frame_lock:
-                                self.frame_data = jpeg.tobytes()
-                        buffer = b'' # Reset buffer after successful frame assembly
-
-                # Log statistics every 5 seconds
-                now = time.time()
-                if now - last_report_time >= 5:
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    good = packets_received - packets_bad_checksum
-                    print(f"[{timestamp}] Packets received: {packets_received}, Good: {good}, Bad checksum: {packets_bad_checksum}")
-                    last_report_time = now
-        except Exception as e:
-            # Clean up socket on exit
-            if sock:
-                sock.close()
-            raise e
-
-
-    def _udp_listener_with_retry(self) -> None:
-        """
-        Wraps the UDP listener in a loop with retry logic using exponential backoff
-        to handle and recover from simulated or real socket failures.
-
-        :return: None. Runs indefinitely in a daemon thread.
-        """
-        while True:
-            try:
-                self._udp_listener()
-            except (OSError, socket.error, ConnectionError) as e:
-                print(f"UDP listener error: {e}")
-                for attempt, delay in enumerate(self._exponential_backoff_with_jitter(), 1):
-                    print(f"Retry {attempt} in {delay:.2f}s...")
-                    time.sleep(delay)
-                    try:
-                        print("Attempting to reinitialize UDP listener...")
-                        # Reset failure state if the listener is successfully reinitialized
-                        self.failure_triggered = False
-                        self.start_time = time.time() # Reset simulation timer
-                        self._udp_listener() # This call blocks until a new error occurs or forever
-                        print("Listener successfully restored.")
-                        break # Exit the backoff loop and continue the main while True loop
-                    except Exception as err:
-                        print(f"Retry {attempt} failed: {err}")
-                else:
-                    # This block executes if the loop completes (max retries reached)
-                    print("Maximum retries reached. Shutting down UDP listener thread.")
-                    return
-
-
-    def _generate_frames(self) -> Iterator[bytes]:
+    async def _report_stats(self) -> None:
         """
-        Generator function that yields JPEG video frames formatted for
-        HTTP Multipart streaming (MJPEG).
+        Logs the relay's packet statistics every 5 seconds.
 
-        :return: A generator yielding byte chunks of the HTTP response,
-                 each containing a single JPEG frame.
+        :return: None. Runs until cancelled.
         """
         while True:
-            frame: bytes = b''
-            with self.frame_lock:
-                if self.frame_data:
-                    frame = self.frame_data
-                else:
-                    # Skip if no frame data is available yet
-                    continue
-
-            # Yield the frame using the multipart boundary
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-
-    def index(self) -> str:
-        """
-        Flask route handler for the root path ('/'). Displays a simple HTML page
-        with an image tag pointing to the video feed.
+            await asyncio.sleep(5)
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            received = self.relay.packetsReceived
+            bad = self.relay.packetsBadChecksum
+            print(f"[{timestamp}] Packets received: {received}, Good: {received - bad}, Bad checksum: {bad}")
 
-        :return: HTML string for the main page.
+    async def _udp_listener_with_retry(self) -> None:
         """
-        return '<h2>UDP Camera Stream</h2><img src="/video_feed">'
+        Closes the relay's UDP socket every 'simulate_failure_after' seconds and
+        rebinds it with exponential backoff, to exercise recovery from socket failures.
 
-    def video_feed(self) -> Response:
+        :return: None. Runs until cancelled or until the maximum retries are reached.
         """
-        Flask route handler for the video stream ('/video_feed').
-
-        This endpoint initiates the MJPEG stream response.
-
-        :return: A Flask Response object configured for MJPEG streaming.
-        """
-        return Response(self._generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+        while True:
+            await asyncio.sleep(self.simulate_failure_after)
+            print("Simulating UDP listener failure...")
+            self.relay.transport.close()
+            print("UDP listener error: Simulated socket failure")
+            for attempt, delay in enumerate(self._exponential_backoff_with_jitter(), 1):
+                print(f"Retry {attempt} in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+                try:
+                    print("Attempting to reinitialize UDP listener...")
+                    await self.relay.openIngest()
+                    print("Listener successfully restored.")
+                    break
+                except OSError as err:
+                    print(f"Retry {attempt} failed: {err}")
+            else:
+                # This block executes if the loop completes (max retries reached)
+                print("Maximum retries reached. Shutting down UDP listener.")
+                return
+
+    async def serve(self) -> None:
+        """
+        Serves the relay together with the statistics and failure simulation tasks.
+
+        :return: None. Runs until cancelled.
+        """
+        tasks = [asyncio.ensure_future(self._report_stats()),
+                 asyncio.ensure_future(self._udp_listener_with_retry())]
+        try:
+            await self.relay.serve()
+        finally:
+            for task in tasks:
+                task.cancel()
 
     def run(self) -> None:
         """
-        Starts the UDP listener thread and the Flask HTTP server.
+        Starts the UDP ingest and the HTTP server on one event loop.
 
         :return: None. Runs the application until terminated.
         """
         print("Starting Video Streaming Server...")
-        # Start the UDP listener thread
-        threading.Thread(target=self._udp_listener_with_retry, daemon=True).start()
-
-        # Start the Flask web server
-        self.app.run(host=self.UDP_IP, port=self.HTTP_PORT)
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
@@ -1,75 +1,56 @@
-import socket
-import threading
-import zlib
-import cv2
-import numpy as np
-from flask import Flask, Response
+"""
+UDP-to-HTTP video bridge for the dashboard
 
-UDP_IP = "0.0.0.0"
-UDP_PORT = 9990
-CHUNK_SIZE = 65000
-
-latest_frame = None
-lock = threading.Lock()
-
-app = Flask(__name__)
-
-# ---------------- UDP RECEIVER ----------------
-def udp_receiver():
-    global latest_frame
-
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((UDP_IP, UDP_PORT))
+Receives JPEG chunks from every robot on UDP 9990 and serves them on port 5000:
+  /video, /video/<stream>  MJPEG stream (default stream, or one robot's)
+  /video/<stream>/160x120  MJPEG preview, made only while someone watches it
+  /ws, /ws/<stream>        WebSocket, one binary JPEG message per frame (App.vue)
+  /streams                 JSON list of live streams
 
-    buffer = b""
+All viewers are served from one asyncio event loop (VideoRelay).
+"""
+import sys
+from pathlib import Path
 
-    while True:
-        packet, _ = sock.recvfrom(CHUNK_SIZE + 4)
-        chunk = packet[:-4]
-        recv_checksum = int.from_bytes(packet[-4:], "big")
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'ACP_comm_test'))
+from ACP.acpcomms.python3.video_relay import VideoRelay
 
-        if zlib.crc32(chunk) != recv_checksum:
-            buffer = b""
-            continue
-
-        buffer += chunk
-
-        # JPEG end marker
-        if buffer.endswith(b'\xff\xd9'):
-            img = cv2.imdecode(
-                np.frombuffer(buffer, dtype=np.uint8),
-                cv2.IMREAD_COLOR
-            )
-            buffer = b""
+UDP_IP = "0.0.0.0"
+UDP_PORT = 9990
+HTTP_PORT = 5000
+CHUNK_SIZE = 65000
 
-            if img is not None:
-                with lock:
-                    latest_frame = img
+# Upper bound on frames per second sent to each HTTP client
+MAX_CLIENT_FPS = 30
 
-# ---------------- HTTP STREAM ----------------
-def mjpeg_generator():
-    while True:
-        with lock:
-            if latest_frame is None:
-                continue
-            _, jpeg = cv2.imencode(".jpg", latest_frame)
-            frame = jpeg.tobytes()
+# Stream ID per sender, keyed by "ip:port" or "ip" (every port of that host);
+# unnamed senders use "ip:port"
+STREAM_NAMES = {
+    # "192.168.1.50": "irap",
+}
+# Stream shown on /video and /ws; None picks the oldest live stream
+DEFAULT_STREAM = None
 
-        yield (
-            b"--frame\r\n"
-            b"Content-Type: image/jpeg\r\n\r\n" +
-            frame +
-            b"\r\n"
-        )
+# Streams silent this long (s) are dropped
+IDLE_TIMEOUT = 10.0
+# Frames larger than this are dropped, bounding memory per stream
+MAX_FRAME_BYTES = 4 * 1024 * 1024
 
-@app.route("/video")
-def video():
-    return Response(
-        mjpeg_generator(),
-        mimetype="multipart/x-mixed-replace; boundary=frame"
-    )
+# Preview sizes for overview pages, served on /video/<stream>/<W>x<H>
+RENDITIONS = ((160, 120), (320, 240))
 
 # ---------------- MAIN ----------------
 if __name__ == "__main__":
-    threading.Thread(target=udp_receiver, daemon=True).start()
-    app.run(host="0.0.0.0", port=5000, threaded=True)
+    relay = VideoRelay(
+        UDP_PORT, HTTP_PORT,
+        host=UDP_IP,
+        videoPath="/video",
+        maxFps=MAX_CLIENT_FPS,
+        chunkSize=CHUNK_SIZE,
+        streamNames=STREAM_NAMES,
+        defaultStream=DEFAULT_STREAM,
+        idleTimeout=IDLE_TIMEOUT,
+        maxFrameBytes=MAX_FRAME_BYTES,
+        renditions=RENDITIONS
+    )
+    relay.run()
@@ -6,19 +6,43 @@ import cv2
 import time
 import threading
 import numpy as np
+from collections import namedtuple
 from CameraCalibration.CalibrationConfig import *
+from frame_ring import FrameRing
+from color_segmenter import ColorSegmenter
+from color_tracker import ColorTracker, Track
 
 if sys.version_info.major == 2:
     print('Please run this program with python3!')
     sys.exit(0)
 
+# 检测结果快照, 发布后不再修改; colors 为 ((颜色名, (x, y, w, h, area)), ...)
+# tracks 为带稳定 ID 和速度的 Track 元组
+Detections = namedtuple('Detections', ['frame_id', 'stamp', 'colors', 'tracks'], defaults=((),))
+
+# MJPG 直通模式下按缩小倍数解码, 只解出检测需要的像素
+REDUCED_DECODE = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                  (2, cv2.IMREAD_REDUCED_COLOR_2), (1, cv2.IMREAD_COLOR))
+
 class Camera:
-    def __init__(self, resolution=(640, 480)):
+    def __init__(self, resolution=(640, 480), ring_slots=4,
+                 detect_fps=10, detect_scale=0.5, detect_roi=None,
+                 capture_format='YUYV'):
         self.cap = None
         self.width = resolution[0]
         self.height = resolution[1]
-        self.frame = None
+        # 最新一帧是否有效; frame 属性从帧环读取, 采集线程不为它分配内存
+        self.frame_valid = False
         self.opened = False
+        # 'MJPG': 摄像头自带的 JPEG 原样转发 (wait_jpeg), 不逐帧解码, frame 保持 None
+        self.passthrough = capture_format == 'MJPG'
+        self.native_size = (self.width, self.height)
+        self.jpeg = None
+        self.jpeg_seq = 0
+        self.jpeg_stamp = 0.0
+        self.jpeg_cond = threading.Condition()
+        # 共享内存帧环, 其他进程可通过 wait_frame 等待新帧
+        self.ring = FrameRing((self.height, self.width, 3), np.uint8, ring_slots)
         #加载参数
         self.param_data = np.load(calibration_param_path + '.npz')
         
@@ -35,6 +59,11 @@ class Camera:
             self.newcameramtx,
             (self.width, self.height), 5
         )
+        # 缩放+去畸变合并为一次定点 remap, 按采集分辨率缓存
+        self.remap_cache = {}
+        self.remap_maps((self.width, self.height))
+        # remap 输出缓冲区, 每帧复用, 发布时拷进共享内存帧环
+        self.out_buffer = np.empty((self.height, self.width, 3), np.uint8)
 
         # ---------- ADD: HSV color ranges ----------
         self.color_ranges = {
@@ -51,17 +80,66 @@ class Camera:
             'green': (0, 255, 0),
             'blue': (255, 0, 0)
         }
+        # 检测在独立线程中按 detect_fps 运行, 使用缩小后的图像或 ROI (x, y, w, h)
+        self.detect_fps = detect_fps
+        self.detect_scale = detect_scale
+        self.detect_roi = detect_roi
+        self.detections = Detections(0, 0.0, ())
+        self.detect_buffer = np.empty((self.height, self.width, 3), np.uint8)
+        # 所有颜色一次查表完成分割, 修改 color_ranges 后需重新创建
+        self.segmenter = ColorSegmenter(
+            self.color_ranges,
+            min_area=1500 * detect_scale * detect_scale,
+            kernel_size=max(3, int(5 * detect_scale) | 1)
+        )
+        # 跟踪上一帧的色块, 只在其附近搜索, 丢失时才全图扫描
+        self.tracker = ColorTracker(self.segmenter)
         # -----------------------------------------
 
+        self.running = True
         self.th = threading.Thread(target=self.camera_task, args=(), daemon=True)
         self.th.start()
+        self.detect_th = threading.Thread(target=self.detect_task, args=(), daemon=True)
+        self.detect_th.start()
+
+    def remap_maps(self, src_size, dst_size=None):
+        """
+        Fixed-point maps going straight from a capture of src_size (w, h)
+        to the rectified output, replacing the resize + remap pair.
+        dst_size defaults to the camera resolution; a smaller one gives a
+        rectified image already at detection scale.
+        """
+        dst_size = dst_size or (self.width, self.height)
+        maps = self.remap_cache.get((src_size, dst_size))
+        if maps is None:
+            mapx, mapy = self.mapx, self.mapy
+            if dst_size != (self.width, self.height):
+                mapx = cv2.resize(mapx, dst_size, interpolation=cv2.INTER_LINEAR)
+                mapy = cv2.resize(mapy, dst_size, interpolation=cv2.INTER_LINEAR)
+            sx = src_size[0] / self.width
+            sy = src_size[1] / self.height
+            # pixel-centre aligned scaling into the native frame
+            mapx = (mapx + 0.5) * sx - 0.5
+            mapy = (mapy + 0.5) * sy - 0.5
+            maps = cv2.convertMaps(mapx, mapy, cv2.CV_16SC2)
+            self.remap_cache[(src_size, dst_size)] = maps
+        return maps
 
     def camera_open(self):
         try:
             self.cap = cv2.VideoCapture(-1)
-            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('Y', 'U', 'Y', 'V'))
+            if self.passthrough:
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+                # read() 返回未解码的 JPEG 数据
+                self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            else:
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('Y', 'U', 'Y', 'V'))
             self.cap.set(cv2.CAP_PROP_FPS, 30)
             self.cap.set(cv2.CAP_PROP_SATURATION, 40)
+            self.native_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            if not self.passthrough:
+                self.remap_maps(self.native_size)
             self.opened = True
         except Exception as e:
             print('打开摄像头失败:', e)
@@ -77,73 +155,54 @@ class Camera:
         except Exception as e:
             print('关闭摄像头失败:', e)
 
+    def close(self):
+        """
+        Release the camera, stop the worker threads and free the shared
+        memory frame ring. The Camera cannot be reopened afterwards.
+        """
+        self.camera_close()
+        self.frame_valid = False
+        self.running = False
+        for th in (self.th, self.detect_th):
+            if th is not threading.current_thread():
+                th.join()
+        self.ring.close()
+
+    @property
+    def frame(self):
+        """
+        Copy of the newest rectified frame, None before the first one, after
+        a failed read and in MJPG mode. The copy is made from the ring when
+        read, so capturing never allocates; wait_frame(out=...) reuses a
+        caller's buffer instead.
+        """
+        if not self.frame_valid:
+            return None
+        return self.ring.read()[2]
+
     def camera_task(self):
-        while True:
+        while self.running:
             try:
                 if self.opened and self.cap.isOpened():
                     ret, frame_tmp = self.cap.read()
-                    if ret:
-                        frame_resize = cv2.resize(
-                            frame_tmp,
-                            (self.width, self.height),
-                            interpolation=cv2.INTER_NEAREST
+                    if ret and self.passthrough:
+                        self.publish_jpeg(frame_tmp.tobytes())
+                    elif ret:
+                        map1, map2 = self.remap_maps(
+                            (frame_tmp.shape[1], frame_tmp.shape[0])
                         )
                         frame = cv2.remap(
-                            frame_resize,
-                            self.mapx, self.mapy,
-                            cv2.INTER_LINEAR
+                            frame_tmp,
+                            map1, map2,
+                            cv2.INTER_LINEAR,
+                            dst=self.out_buffer
                         )
 
-                        # ---------- ADD: COLOR DETECTION ----------
-                        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-                        for color_name, ranges in self.color_ranges.items():
-                            mask = None
-                            for lower, upper in ranges:
-                                m = cv2.inRange(
-                                    hsv,
-                                    np.array(lower),
-                                    np.array(upper)
-                                )
-                                mask = m if mask is None else cv2.bitwise_or(mask, m)
-
-                            mask = cv2.morphologyEx(
-                                mask, cv2.MORPH_OPEN,
-                                np.ones((5, 5), np.uint8)
-                            )
-
-                            contours, _ = cv2.findContours(
-                                mask,
-                                cv2.RETR_EXTERNAL,
-                                cv2.CHAIN_APPROX_SIMPLE
-                            )
-
-                            if contours:
-                                c = max(contours, key=cv2.contourArea)
-                                if cv2.contourArea(c) > 1500:
-                                    x, y, w, h = cv2.boundingRect(c)
-                                    cv2.rectangle(
-                                        frame,
-                                        (x, y),
-                                        (x + w, y + h),
-                                        self.color_draw[color_name],
-                                        2
-                                    )
-                                    cv2.putText(
-                                        frame,
-                                        color_name,
-                                        (x, y - 5),
-                                        cv2.FONT_HERSHEY_SIMPLEX,
-                                        0.6,
-                                        self.color_draw[color_name],
-                                        2
-                                    )
-                        # ----------------------------------------
-
-                        self.frame = frame
+                        self.ring.publish(frame)
+                        self.frame_valid = True
                     else:
                         print(1)
-                        self.frame = None
+                        self.frame_valid = False
                         cap = cv2.VideoCapture(-1)
                         ret, _ = cap.read()
                         if ret:
@@ -160,15 +219,144 @@ class Camera:
                 print('获取摄像头画面出错:', e)
                 time.sleep(0.01)
 
+    def publish_jpeg(self, jpeg, stamp=None):
+        with self.jpeg_cond:
+            self.jpeg = jpeg
+            self.jpeg_seq += 1
+            self.jpeg_stamp = time.time() if stamp is None else stamp
+            self.jpeg_cond.notify_all()
+
+    def wait_jpeg(self, last_seq=0, timeout=None):
+        """
+        Block until a camera JPEG newer than last_seq arrives (MJPG mode).
+        Returns (seq, stamp, jpeg bytes); jpeg is None on timeout.
+        """
+        with self.jpeg_cond:
+            if not self.jpeg_cond.wait_for(lambda: self.jpeg_seq > last_seq, timeout):
+                return last_seq, 0.0, None
+            return self.jpeg_seq, self.jpeg_stamp, self.jpeg
+
+    def decode_jpeg(self, jpeg, dst_size=None):
+        """
+        Decode a camera JPEG into a rectified BGR image of dst_size, using
+        libjpeg's reduced-scale decoding when the target is small enough.
+        """
+        dst_size = dst_size or (self.width, self.height)
+        for factor, flag in REDUCED_DECODE:
+            if self.native_size[0] // factor >= dst_size[0] or factor == 1:
+                break
+        img = cv2.imdecode(np.frombuffer(jpeg, np.uint8), flag)
+        if img is None:
+            return None
+        map1, map2 = self.remap_maps((img.shape[1], img.shape[0]), dst_size)
+        return cv2.remap(img, map1, map2, cv2.INTER_LINEAR)
+
+    def detect_task(self):
+        seq = 0
+        while self.running:
+            try:
+                if self.passthrough:
+                    seq, stamp, jpeg = self.wait_jpeg(seq, 0.5)
+                    if jpeg is None:
+                        continue
+                    start = time.time()
+                    small = self.decode_jpeg(jpeg, (int(self.width * self.detect_scale),
+                                                    int(self.height * self.detect_scale)))
+                    if small is None:
+                        continue
+                    self.detections = self.detect(small, seq, stamp, scaled=True)
+                else:
+                    seq, stamp, frame = self.ring.wait(seq, 0.5, self.detect_buffer)
+                    if frame is None:
+                        continue
+                    start = time.time()
+                    # 整体替换快照, 读者不会看到清空一半的结果
+                    self.detections = self.detect(frame, seq, stamp)
+                if self.detect_fps:
+                    delay = 1.0 / self.detect_fps - (time.time() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+            except Exception as e:
+                print('颜色识别出错:', e)
+                time.sleep(0.01)
+
+    def detect(self, frame, frame_id=0, stamp=0.0, scaled=False):
+        """
+        Track colors in the next frame and return a Detections snapshot.
+        frame is full resolution, or already at detect_scale when scaled is True.
+        """
+        scale = self.detect_scale
+        x0, y0 = 0, 0
+        if self.detect_roi is not None:
+            x0, y0, w, h = self.detect_roi
+            if scaled:
+                frame = frame[int(y0 * scale):int((y0 + h) * scale),
+                              int(x0 * scale):int((x0 + w) * scale)]
+            else:
+                frame = frame[y0:y0 + h, x0:x0 + w]
+        if not scaled and scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+
+        def to_full(box):
+            x, y, w, h, area = box
+            return (x0 + int(x / scale), y0 + int(y / scale),
+                    int(w / scale), int(h / scale), int(area / (scale * scale)))
+
+        tracks = tuple(
+            Track(t.track_id, t.name, to_full(t.box),
+                  (t.velocity[0] / scale, t.velocity[1] / scale))
+            for t in self.tracker.update(frame, stamp)
+        )
+        colors = tuple((t.name, t.box) for t in tracks)
+        return Detections(frame_id, stamp, colors, tracks)
+
+    @property
+    def detected_colors(self):
+        return frozenset(name for name, _ in self.detections.colors)
+
+    def draw_detections(self, frame, detections=None):
+        """Draw the boxes of a Detections snapshot (default: the latest) onto frame."""
+        detections = self.detections if detections is None else detections
+        for color_name, (x, y, w, h, _) in detections.colors:
+            cv2.rectangle(
+                frame,
+                (x, y),
+                (x + w, y + h),
+                self.color_draw[color_name],
+                2
+            )
+            cv2.putText(
+                frame,
+                color_name,
+                (x, y - 5),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                self.color_draw[color_name],
+                2
+            )
+        return frame
+
+    def wait_frame(self, last_seq=0, timeout=None, out=None):
+        """
+        Block until a frame newer than last_seq is captured.
+        Returns (seq, stamp, frame); frame is None on timeout.
+        In MJPG mode the frame is decoded on demand for this caller only.
+        """
+        if self.passthrough:
+            seq, stamp, jpeg = self.wait_jpeg(last_seq, timeout)
+            return seq, stamp, None if jpeg is None else self.decode_jpeg(jpeg)
+        return self.ring.wait(last_seq, timeout, out)
+
 if __name__ == '__main__':
     my_camera = Camera()
     my_camera.camera_open()
+    seq = 0
     while True:
-        img = my_camera.frame
+        seq, _, img = my_camera.wait_frame(seq, timeout=1.0)
         if img is not None:
-            cv2.imshow('img', img)
+            cv2.imshow('img', my_camera.draw_detections(img))
             key = cv2.waitKey(1)
             if key == 27:
                 break
-    my_camera.camera_close()
+    my_camera.close()
     cv2.destroyAllWindows()
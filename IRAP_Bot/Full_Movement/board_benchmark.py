@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# 用模拟板测量 SDK: 命令吞吐, 舵机读延迟, 接收解析的 CPU 占用
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import ros_robot_controller_sdk as sdk
+from board_simulator import BoardSimulator
+
+@contextlib.contextmanager
+def connect(transport, tx_interval=0.01, **sim_args):
+    sim = BoardSimulator(transport=transport, **sim_args)
+    if transport == "pty":
+        board = sdk.Board(device=sim.device, tx_interval=tx_interval)
+    else:
+        board = sdk.Board(port=sim.port, tx_interval=tx_interval)
+    board.enable_reception()
+    try:
+        yield sim, board
+    finally:
+        board.close()
+        sim.close()
+
+def thread_cpu(thread):
+    # Linux: 从 /proc 读单个线程的 CPU 时间(秒)
+    try:
+        with open(f"/proc/self/task/{thread.native_id}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / 100.0
+    except OSError:
+        return time.process_time()
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def bench_commands(transport, seconds):
+    print("command throughput (4 motors + 5 PWM servos per call pair)")
+    for tx_interval in (0.0, 0.01):
+        with connect(transport, tx_interval, imu_rate=0, sys_rate=0) as (sim, board):
+            calls = 0
+            end = time.monotonic() + seconds
+            while time.monotonic() < end:
+                v = calls % 100
+                board.set_motor_duty([[1, v], [2, v], [3, -v], [4, -v]])
+                board.pwm_servo_set_position(0.02, [[s, 1000 + v] for s in (1, 2, 3, 4, 5)])
+                calls += 2
+            board.flush(1.0)
+            time.sleep(0.05)
+            stats = board.link_stats()
+            print(f"  tx_interval {tx_interval * 1000:4.1f} ms: {calls / seconds:9.0f} calls/s  "
+                  f"{stats['frames']:6d} frames in {stats['writes']:5d} writes  "
+                  f"{stats['coalesced']:8d} superseded  board got {sim.stats['frames_in']} frames")
+
+def bench_reads(transport, count):
+    print("servo read latency")
+    with connect(transport, imu_rate=100) as (sim, board):
+        for name, read in (("single read", lambda: board.bus_servo_read_position(1)),
+                           ("read 6 joints", lambda: board.bus_servo_read_positions([1, 2, 3, 4, 5, 6]))):
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                result = read()
+                latencies.append(time.perf_counter() - start)
+                assert result is not None
+            print(f"  {name:13s}: p50 {percentile(latencies, 0.5) * 1e3:6.2f} ms  "
+                  f"p99 {percentile(latencies, 0.99) * 1e3:6.2f} ms")
+
+def bench_parser(transport, seconds, imu_rate, corrupt_rate):
+    print(f"receive path at {imu_rate:.0f} IMU frames/s, {corrupt_rate:.1%} corrupted")
+    with connect(transport, imu_rate=imu_rate, sys_rate=10, gamepad_rate=50,
+                 corrupt_rate=corrupt_rate, seed=1) as (sim, board):
+        time.sleep(0.2)
+        blocks = []
+        board.add_imu_callback(lambda stamps, samples: blocks.append(len(samples)))
+        cpu = thread_cpu(board.recv_thread)
+        count = board.imu_ring.count
+        time.sleep(seconds)
+        cpu = thread_cpu(board.recv_thread) - cpu
+        received = board.imu_ring.count - count
+        print(f"  receive thread CPU {cpu / seconds:6.1%}  IMU samples {received / seconds:8.0f}/s  "
+              f"in {len(blocks)} blocks (max {max(blocks, default=0)})  "
+              f"CRC errors {board.crc_errors}  sent corrupt {sim.stats['corrupt_out']}  "
+              f"dropped {sim.stats['dropped_out']}")
+
+        # 不经过串口, 只测 parse_frames 本身(先停止接收线程)
+        board.stop()
+        frame = sim.frame(sdk.PacketFunction.PACKET_FUNC_IMU, "<6f", 0, 0, 9.8, 0, 0, 0)
+        buf = bytearray(frame * 20000)
+        start = time.process_time()
+        board.parse_frames(buf)
+        elapsed = time.process_time() - start
+        print(f"  parse_frames alone: {elapsed / 20000 * 1e6:6.2f} us/frame  "
+              f"{len(buf) / elapsed / 1e6:6.2f} MB/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure command throughput, servo read latency and receive CPU load against the simulated board.")
+    parser.add_argument("--transport", choices=("pty", "memory"), default="pty")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--imu-rate", type=float, default=1000.0)
+    parser.add_argument("--corrupt-rate", type=float, default=0.001)
+    args = parser.parse_args()
+
+    print("crc8 backend:", "crcmod C extension" if sdk._crcmod_compiled else "pure Python")
+    bench_commands(args.transport, args.seconds)
+    bench_reads(args.transport, args.reads)
+    bench_parser(args.transport, args.seconds, args.imu_rate, args.corrupt_rate)
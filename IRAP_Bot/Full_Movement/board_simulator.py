@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# STM32 扩展板模拟器: 在 pty 或内存传输上实现 0xAA 0x55 帧协议, 没有硬件时用来测试和测量 SDK
+import os
+import pty
+import sys
+import tty
+import math
+import time
+import array
+import fcntl
+import heapq
+import random
+import socket
+import termios
+import selectors
+import threading
+import collections
+from pathlib import Path
+
+import serial
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import ros_robot_controller_sdk as sdk
+from ros_robot_controller_sdk import PacketFunction, packer
+
+class MemoryPort:
+    """
+    Minimal stand-in for serial.Serial over a socketpair.
+
+    Pass it to Board(port=...); it has the members Board uses (read, write,
+    in_waiting, fileno, is_open, close, baudrate).
+    """
+
+    def __init__(self, sock, baudrate=1000000):
+        self.sock = sock
+        self.baudrate = baudrate
+        self.is_open = True
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    @property
+    def in_waiting(self):
+        count = array.array('i', [0])
+        fcntl.ioctl(self.sock.fileno(), termios.FIONREAD, count)
+        return count[0]
+
+    def read(self, size=1):
+        data = self.sock.recv(size)
+        if not data:
+            # 与 pyserial 在设备断开时的行为一致
+            raise serial.SerialException("simulator closed the connection")
+        return data
+
+    def write(self, data):
+        self.sock.sendall(data)
+        return len(data)
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self.sock.close()
+
+class BoardSimulator:
+    """
+    Simulated controller board.
+
+    Parses host frames with the SDK's own parser, tracks motor and servo
+    state, answers servo reads after reply_delay, and emits IMU, battery and
+    gamepad reports at the configured rates. A fraction corrupt_rate of the
+    reports is sent with a broken checksum or behind a fake frame header.
+
+    With transport="pty" connect via Board(device=sim.device); with
+    transport="memory" via Board(port=sim.port).
+    """
+
+    # 总线舵机读命令 -> (回复格式, 状态字段)
+    BUS_SERVO_READS = {
+        0x12: ("<BBbB", 'id'),
+        0x22: ("<BBbb", 'offset'),
+        0x05: ("<BBbh", 'position'),
+        0x07: ("<BBbH", 'vin'),
+        0x09: ("<BBbB", 'temp'),
+        0x3A: ("<BBbB", 'temp_limit'),
+        0x32: ("<BBb2H", 'angle_limit'),
+        0x36: ("<BBb2H", 'vin_limit'),
+        0x0D: ("<BBbb", 'torque'),
+    }
+    PWM_SERVO_READS = {
+        0x05: ("<BBH", 'position'),
+        0x09: ("<BBb", 'offset'),
+    }
+
+    def __init__(self, transport="pty", imu_rate=100.0, sys_rate=1.0, gamepad_rate=0.0,
+                 servo_ids=(1, 2, 3, 4, 5, 6), reply_delay=0.0005, corrupt_rate=0.0,
+                 battery=7400, max_pending=65536, seed=None):
+        """
+        Args:
+            transport: "pty" or "memory"
+            imu_rate, sys_rate, gamepad_rate: Reports per second, 0 disables
+            servo_ids: Bus servos present; reads of other IDs get no reply
+            reply_delay: Seconds between a servo read and its reply
+            corrupt_rate: Share of reports sent corrupted (0-1)
+            battery: Reported battery voltage in mV
+            max_pending: Bytes of unread output kept before reports are dropped,
+                         like a UART overrun when the host stops reading
+            seed: Random seed for corruption
+        """
+        if transport == "pty":
+            self.fd, self.slave_fd = pty.openpty()
+            tty.setraw(self.fd)
+            tty.setraw(self.slave_fd)
+            os.set_blocking(self.fd, False)
+            self.device = os.ttyname(self.slave_fd)
+            self.port = None
+            self.sock = None
+        elif transport == "memory":
+            self.sock, host = socket.socketpair()
+            self.sock.setblocking(False)
+            self.fd = self.sock.fileno()
+            self.slave_fd = None
+            self.device = None
+            self.port = MemoryPort(host)
+        else:
+            raise ValueError("transport must be 'pty' or 'memory'")
+        self.transport = transport
+
+        self.rates = {'imu': imu_rate, 'sys': sys_rate, 'gamepad': gamepad_rate}
+        self.reply_delay = reply_delay
+        self.corrupt_rate = corrupt_rate
+        self.battery = battery
+        self.max_pending = max_pending
+        self.random = random.Random(seed)
+
+        self.bus_servos = {servo_id: self._new_bus_servo(servo_id) for servo_id in servo_ids}
+        self.pwm_servos = {servo_id: {'position': 1500, 'offset': 0} for servo_id in range(1, 5)}
+        self.motors = {}  # 电机ID -> (子命令, 值)
+        self.rgb = {}
+        self.stats = {'frames_in': 0, 'bytes_in': 0, 'reports_out': 0, 'bytes_out': 0,
+                      'corrupt_out': 0, 'dropped_out': 0, 'reads': 0}
+        self.received = collections.Counter()  # 功能码 -> 收到的帧数
+
+        self.parsers = {
+            PacketFunction.PACKET_FUNC_MOTOR: self.on_motor,
+            PacketFunction.PACKET_FUNC_PWM_SERVO: self.on_pwm_servo,
+            PacketFunction.PACKET_FUNC_BUS_SERVO: self.on_bus_servo,
+            PacketFunction.PACKET_FUNC_RGB: self.on_rgb,
+        }
+        self.recv_buffer = bytearray()
+        self.crc_errors = 0
+        self.out = bytearray()
+        self.replies = []  # (发送时间, 序号, 帧) 小顶堆
+        self.reply_seq = 0
+        self.frame_buf = bytearray(260)
+        self.lock = threading.Lock()
+
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_w, False)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _new_bus_servo(servo_id):
+        return {'id': servo_id, 'offset': 0, 'position': 500, 'vin': 7400, 'temp': 35,
+                'temp_limit': 85, 'angle_limit': (0, 1000), 'vin_limit': (4500, 14500), 'torque': 1}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup()
+        self.thread.join()
+        for fd in (self.wakeup_r, self.wakeup_w, self.slave_fd):
+            if fd is not None:
+                os.close(fd)
+        if self.sock is not None:
+            self.sock.close()
+            self.port.close()
+        else:
+            os.close(self.fd)
+
+    # 复用 SDK 的解析器处理主机发来的帧
+    parse_frames = sdk.Board.parse_frames
+
+    def frame(self, func, fmt, *values):
+        """Build one frame as bytes."""
+        end = sdk.pack_frame_into(self.frame_buf, 0, func, packer(fmt), values)
+        return bytes(self.frame_buf[:end])
+
+    def send(self, data, report=True):
+        """Queue bytes for the host; reports are dropped while the host lags."""
+        with self.lock:
+            if report and len(self.out) + len(data) > self.max_pending:
+                self.stats['dropped_out'] += 1
+                return
+            self.out += data
+        if threading.current_thread() is not self.thread:
+            self._wakeup()
+
+    def _wakeup(self):
+        try:
+            os.write(self.wakeup_w, b'\0')
+        except BlockingIOError:
+            pass
+
+    def inject(self, data):
+        """Send raw bytes to the host, e.g. noise or a hand-made bad frame."""
+        self.send(bytes(data), report=False)
+
+    def corrupt(self, frame):
+        """Damage a frame: flip its checksum or put a fake header before it."""
+        self.stats['corrupt_out'] += 1
+        if self.random.random() < 0.5:
+            return frame[:-1] + bytes([frame[-1] ^ 0xFF])
+        return b'\xaa\x55' + bytes([self.random.randrange(PacketFunction.PACKET_FUNC_NONE), 40]) + frame
+
+    def report(self, frame):
+        if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+            frame = self.corrupt(frame)
+        self.send(frame)
+        self.stats['reports_out'] += 1
+
+    def emit(self, name, now):
+        if name == 'imu':
+            t = now * 2 * math.pi
+            self.report(self.frame(PacketFunction.PACKET_FUNC_IMU, "<6f",
+                                   0.1 * math.sin(t), 0.1 * math.cos(t), 9.8, 0.01, -0.01, 0.5 * math.sin(t)))
+        elif name == 'sys':
+            self.report(self.frame(PacketFunction.PACKET_FUNC_SYS, "<BH", 0x04, self.battery))
+        elif name == 'gamepad':
+            self.report(self.frame(PacketFunction.PACKET_FUNC_GAMEPAD, "<HB4b", 0, 0x0F, 0, 0, 0, 0))
+
+    def reply(self, frame):
+        self.reply_seq += 1
+        heapq.heappush(self.replies, (time.monotonic() + self.reply_delay, self.reply_seq, frame))
+
+    def on_motor(self, data):
+        self.received[PacketFunction.PACKET_FUNC_MOTOR] += 1
+        sub, count = data[0], data[1]
+        values = packer("<" + "Bf" * count).unpack_from(data, 2)
+        for motor_id, value in zip(values[0::2], values[1::2]):
+            self.motors[motor_id + 1] = (sub, value)
+
+    def on_rgb(self, data):
+        self.received[PacketFunction.PACKET_FUNC_RGB] += 1
+        values = packer("<" + "BBBB" * data[1]).unpack_from(data, 2)
+        for i in range(0, len(values), 4):
+            self.rgb[values[i] + 1] = values[i + 1:i + 4]
+
+    def _set_positions(self, servos, data):
+        # 0x01, 时间(ms), 数量, (ID, 位置) * 数量
+        count = data[3]
+        values = packer("<" + "BH" * count).unpack_from(data, 4)
+        for servo_id, position in zip(values[0::2], values[1::2]):
+            if servo_id in servos:
+                servos[servo_id]['position'] = position
+
+    def on_pwm_servo(self, data):
+        self.received[PacketFunction.PACKET_FUNC_PWM_SERVO] += 1
+        cmd = data[0]
+        if cmd == 0x01:
+            self._set_positions(self.pwm_servos, data)
+        elif cmd == 0x07:
+            _, servo_id, offset = packer("<BBb").unpack(data)
+            self.pwm_servos.setdefault(servo_id, {'position': 1500, 'offset': 0})['offset'] = offset
+        elif cmd in self.PWM_SERVO_READS:
+            self.stats['reads'] += 1
+            fmt, field = self.PWM_SERVO_READS[cmd]
+            servo = self.pwm_servos.get(data[1])
+            if servo is not None:
+                self.reply(self.frame(PacketFunction.PACKET_FUNC_PWM_SERVO, fmt, data[1], cmd, servo[field]))
+
+    def on_bus_servo(self, data):
+        self.received[PacketFunction.PACKET_FUNC_BUS_SERVO] += 1
+        cmd = data[0]
+        if cmd == 0x01:
+            self._set_positions(self.bus_servos, data)
+            return
+        if cmd == 0x03:
+            return
+        if cmd in self.BUS_SERVO_READS:
+            self.stats['reads'] += 1
+            servo_id = data[1]
+            if servo_id == 254 and self.bus_servos:
+                # 广播只在总线上有一个舵机时有意义, 回复第一个
+                servo_id = next(iter(self.bus_servos))
+            servo = self.bus_servos.get(servo_id)
+            if servo is None:
+                return
+            fmt, field = self.BUS_SERVO_READS[cmd]
+            value = servo[field]
+            values = value if isinstance(value, tuple) else (value,)
+            self.reply(self.frame(PacketFunction.PACKET_FUNC_BUS_SERVO, fmt, servo_id, cmd, 0, *values))
+            return
+        servo = self.bus_servos.get(data[1])
+        if servo is None:
+            return
+        if cmd in (0x0B, 0x0C):
+            servo['torque'] = 1 if cmd == 0x0B else 0
+        elif cmd == 0x10:
+            servo['id'] = data[2]
+            self.bus_servos[data[2]] = self.bus_servos.pop(data[1])
+        elif cmd == 0x20:
+            servo['offset'] = packer("<BBb").unpack(data)[2]
+        elif cmd == 0x30:
+            servo['angle_limit'] = packer("<BBHH").unpack(data)[2:]
+        elif cmd == 0x34:
+            servo['vin_limit'] = packer("<BBHH").unpack(data)[2:]
+        elif cmd == 0x38:
+            servo['temp_limit'] = packer("<BBb").unpack(data)[2]
+
+    def _read_host(self):
+        try:
+            data = self.sock.recv(65536) if self.sock is not None else os.read(self.fd, 65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except ConnectionResetError:
+            data = b''
+        if not data:
+            # 内存传输的主机端已关闭, 不再监听读事件
+            self.running = False
+            return
+        self.stats['bytes_in'] += len(data)
+        self.recv_buffer += data
+        before = sum(self.received.values())
+        del self.recv_buffer[:self.parse_frames(self.recv_buffer)]
+        self.stats['frames_in'] += sum(self.received.values()) - before
+
+    def _flush(self):
+        with self.lock:
+            if not self.out:
+                return
+            try:
+                n = self.sock.send(self.out) if self.sock is not None else os.write(self.fd, self.out)
+            except (BlockingIOError, InterruptedError):
+                return
+            except (BrokenPipeError, ConnectionResetError):
+                # 主机已断开, 丢掉未发出的数据
+                self.out.clear()
+                return
+            self.stats['bytes_out'] += n
+            del self.out[:n]
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.fd, selectors.EVENT_READ)
+        selector.register(self.wakeup_r, selectors.EVENT_READ)
+        next_emit = {name: time.monotonic() for name in self.rates}
+        writing = False
+        try:
+            while self.running:
+                now = time.monotonic()
+                for name, rate in self.rates.items():
+                    if not rate:
+                        continue
+                    # 落后时补发, 形成突发
+                    while next_emit[name] <= now:
+                        self.emit(name, next_emit[name])
+                        next_emit[name] += 1.0 / rate
+                while self.replies and self.replies[0][0] <= now:
+                    self.send(heapq.heappop(self.replies)[2], report=False)
+                self._flush()
+
+                if bool(self.out) != writing:
+                    writing = bool(self.out)
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+                    selector.modify(self.fd, events)
+                deadlines = [next_emit[name] for name, rate in self.rates.items() if rate]
+                if self.replies:
+                    deadlines.append(self.replies[0][0])
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                for key, events in selector.select(timeout):
+                    if key.fd == self.wakeup_r:
+                        os.read(self.wakeup_r, 4096)
+                        continue
+                    if events & selectors.EVENT_READ:
+                        self._read_host()
+        except OSError as e:
+            if self.running:
+                print("模拟器错误:", e)
+        finally:
+            selector.close()
+
+if __name__ == "__main__":
+    # 独立运行: 把打印出的设备路径交给 Board(device=...)
+    with BoardSimulator(imu_rate=100, sys_rate=1) as sim:
+        print("simulated board on", sim.device)
+        try:
+            while True:
+                time.sleep(1)
+                print(dict(sim.stats), dict(sim.motors))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# checksum_crc8 微基准: 与原来逐字节查表的实现对比
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import ros_robot_controller_sdk as sdk
+
+def legacy_checksum_crc8(data):
+    # 原实现
+    check = 0
+    for b in data:
+        check = sdk.crc8_table[check ^ b]
+    return check & 0x00FF
+
+def bench(func, data, number):
+    return min(timeit.repeat(lambda: func(data), number=number, repeat=5)) / number * 1e6
+
+if __name__ == "__main__":
+    print("backend:", "crcmod C extension" if sdk._crcmod_compiled else "pure Python")
+    # 典型帧: 舵机读(2), 电机(18), IMU(26), 6 舵机位置(22), 最长帧(257)
+    for size in (4, 20, 28, 40, 257):
+        data = bytes((i * 37) & 0xFF for i in range(size))
+        assert sdk.checksum_crc8(data) == legacy_checksum_crc8(data)
+        assert sdk.crc8_update(sdk.crc8_update(0, data[:size // 2]), data[size // 2:]) == legacy_checksum_crc8(data)
+        number = 20000
+        old = bench(legacy_checksum_crc8, data, number)
+        new = bench(sdk.checksum_crc8, data, number)
+        print(f"{size:4d} bytes: legacy {old:7.3f} us  current {new:7.3f} us  x{old / new:.1f}")
@@ -202,3 +202,5 @@ except KeyboardInterrupt:
 finally:
     stop_motors()
     reset_servos()
+    # Send the queued stop commands before exiting
+    board.close()
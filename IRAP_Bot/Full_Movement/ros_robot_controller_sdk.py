@@ -1,13 +1,27 @@
 #!/usr/bin/env python3
 # encoding: utf-8
 # stm32 python sdk
+import os
 import enum
+import atexit
 import time
 import copy
-import queue
 import struct
+import functools
+import itertools
 import serial
+import numpy as np
+import selectors
 import threading
+import collections
+from concurrent import futures
+
+try:
+    # 可选: crcmod 的 C 扩展, 校验速度是纯 Python 查表的数倍
+    import crcmod
+    from crcmod.crcmod import _usingExtension as _crcmod_compiled
+except ImportError:
+    _crcmod_compiled = False
 
 class PacketControllerState(enum.IntEnum):
     # 通信协议的格式
@@ -66,12 +80,58 @@ crc8_table = [
     116, 42, 200, 150, 21, 75, 169, 247, 182, 232, 10, 84, 215, 137, 107, 53
 ]
 
-def checksum_crc8(data):
-    # 校验
-    check = 0
+def _crc8_update_py(crc, data, table=crc8_table):
     for b in data:
-        check = crc8_table[check ^ b]
-    return check & 0x00FF
+        crc = table[crc ^ b]
+    return crc
+
+if _crcmod_compiled:
+    # CRC-8/MAXIM: 多项式 0x31 反射, 初值 0, 与 crc8_table 相同
+    _crc8_ext = crcmod.mkCrcFun(0x131, initCrc=0, rev=True, xorOut=0)
+
+    def crc8_update(crc, data):
+        """Continue a CRC8 over data (bytes-like), starting from crc."""
+        return _crc8_ext(data, crc)
+
+    # 校验, 直接调用 crcmod 函数省去一层 Python 调用
+    checksum_crc8 = _crc8_ext
+else:
+    def crc8_update(crc, data):
+        """Continue a CRC8 over data (bytes-like), starting from crc."""
+        return _crc8_update_py(crc, data)
+
+    def checksum_crc8(data):
+        # 校验
+        return _crc8_update_py(0, data)
+
+# 帧头: 0xAA 0x55 功能码 数据长度
+FRAME_HEADER = struct.Struct("<BBBB")
+
+@functools.lru_cache(maxsize=None)
+def packer(fmt):
+    """Cached struct.Struct for a format string."""
+    return struct.Struct(fmt)
+
+def pack_frame_into(buf, offset, func, payload, values):
+    """
+    Pack one frame (header, payload, CRC) into a writable buffer.
+
+    Args:
+        buf: bytearray or writable memoryview
+        offset: Where the frame starts
+        func: PacketFunction
+        payload: struct.Struct of the data
+        values: Values for payload
+
+    Returns:
+        int: Offset just past the frame
+    """
+    size = payload.size
+    FRAME_HEADER.pack_into(buf, offset, 0xAA, 0x55, func, size)
+    payload.pack_into(buf, offset + 4, *values)
+    end = offset + 4 + size
+    buf[end] = checksum_crc8(memoryview(buf)[offset + 2:end])
+    return end + 1
 
 class SBusStatus:
     def __init__(self):
@@ -81,7 +141,117 @@ class SBusStatus:
         self.signal_loss = True
         self.fail_safe = False
 
+class TelemetryRing:
+    """
+    Fixed-capacity ring of timestamped samples for one telemetry stream.
+
+    Storage is preallocated numpy arrays. There is a single writer (the
+    receive thread). It advances the writing cursor before touching any slot
+    and publishes the new count afterwards, so readers never take a lock: they
+    copy what they need, then drop every sample the writer may have touched
+    while they were copying.
+    """
+
+    def __init__(self, capacity, shape, dtype=np.uint8):
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self.stamps = np.zeros(capacity, np.float64)
+        self.samples = np.zeros((capacity,) + self.shape, dtype)
+        self.count = 0  # 累计写入完成的样本数
+        self.writing = 0  # 写线程正在写入的上界, 先于槽位更新
+
+    def append(self, sample, stamp):
+        self.writing = self.count + 1
+        i = self.count % self.capacity
+        self.samples[i] = sample
+        self.stamps[i] = stamp
+        self.count += 1
+
+    def extend(self, samples, stamps):
+        """Append a block of samples with one or two slice copies."""
+        total = len(samples)
+        n = min(total, self.capacity)
+        samples, stamps = samples[total - n:], stamps[total - n:]
+        self.writing = self.count + total
+        i = (self.count + total - n) % self.capacity
+        first = min(n, self.capacity - i)
+        self.samples[i:i + first] = samples[:first]
+        self.stamps[i:i + first] = stamps[:first]
+        if first < n:
+            self.samples[:n - first] = samples[first:]
+            self.stamps[:n - first] = stamps[first:]
+        self.count += total
+
+    def append_bytes(self, data, stamp):
+        """Store a raw payload, truncated or zero padded to the sample size."""
+        count = min(len(data) // self.samples.itemsize, self.samples[0].size)
+        row = np.frombuffer(data, self.samples.dtype, count=count)
+        self.writing = self.count + 1
+        i = self.count % self.capacity
+        flat = self.samples[i].reshape(-1)
+        flat[:row.size] = row
+        flat[row.size:] = 0
+        self.stamps[i] = stamp
+        self.count += 1
+
+    def _copy(self, start, stop):
+        start = max(start, stop - self.capacity, 0)
+        if start >= stop:
+            return np.empty(0, np.float64), np.empty((0,) + self.shape, self.samples.dtype)
+        index = np.arange(start, stop) % self.capacity
+        stamps = self.stamps[index]
+        samples = self.samples[index]
+        # 拷贝结束后再读写游标, 拷贝期间可能被覆盖的样本全部丢弃
+        lost = self.writing - self.capacity - start
+        if lost > 0:
+            stamps, samples = stamps[lost:], samples[lost:]
+        return stamps, samples
+
+    def latest(self):
+        """(stamp, sample) of the newest sample, None if empty."""
+        stamps, samples = self.last(1)
+        if len(stamps) == 0:
+            return None
+        return stamps[0], samples[0]
+
+    def last(self, n):
+        """(stamps, samples) of up to the last n samples, oldest first."""
+        count = self.count
+        return self._copy(count - n, count)
+
+    def since(self, stamp):
+        """(stamps, samples) of every buffered sample newer than stamp."""
+        stamps, samples = self.last(self.capacity)
+        start = np.searchsorted(stamps, stamp, side='right')
+        return stamps[start:], samples[start:]
+
+    def read_from(self, cursor):
+        """
+        Samples written since cursor (a previous return value, 0 at first).
+
+        Returns (cursor, stamps, samples); if more than capacity samples
+        arrived in between, only the newest capacity are returned.
+        """
+        count = self.count
+        stamps, samples = self._copy(cursor, count)
+        return count, stamps, samples
+
 class Board:
+    # 总线舵机设置命令之后需要的间隔(秒)
+    bus_servo_gap = 0.02
+
+    # 一批 IMU 样本的最大数量, 超过时分批解码
+    imu_burst_samples = 256
+
+    # 各遥测流环形缓冲区的容量(样本数)
+    telemetry_capacity = {
+        'sys': 64,
+        'key': 64,
+        'imu': 2048,
+        'gamepad': 256,
+        'sbus': 256,
+    }
+
     buttons_map = {
             'GAMEPAD_BUTTON_MASK_L2':        0x0001,
             'GAMEPAD_BUTTON_MASK_R2':        0x0002,
@@ -97,28 +267,50 @@ class Board:
             'GAMEPAD_BUTTON_MASK_R1':        0x8000
     }
 
-    def __init__(self, device="/dev/ttyAMA0", baudrate=1000000, timeout=5):
+    def __init__(self, device="/dev/ttyAMA0", baudrate=1000000, timeout=5, read_timeout=0.1, tx_interval=0.01,
+                 port=None):
         self.enable_recv = False
-        self.frame = []
-        self.recv_count = 0
-
-        self.port = serial.Serial(None, baudrate, timeout=timeout)
-        self.port.rts = False
-        self.port.dtr = False
-        self.port.setPort(device)
-        self.port.open()
-
-        self.state = PacketControllerState.PACKET_CONTROLLER_STATE_STARTBYTE1
-        self.servo_read_lock = threading.Lock()
-        self.pwm_servo_read_lock = threading.Lock()
-        
-        self.sys_queue = queue.Queue(maxsize=1)
-        self.bus_servo_queue = queue.Queue(maxsize=1)
-        self.pwm_servo_queue = queue.Queue(maxsize=1)
-        self.key_queue = queue.Queue(maxsize=1)
-        self.imu_queue = queue.Queue(maxsize=1)
-        self.gamepad_queue = queue.Queue(maxsize=1)
-        self.sbus_queue = queue.Queue(maxsize=1)
+        self.recv_buffer = bytearray()
+        self.crc_errors = 0
+
+        if port is not None:
+            # 已打开的串口或替身(如 board_simulator.MemoryPort), 忽略 device
+            self.port = port
+        else:
+            self.port = serial.Serial(None, baudrate, timeout=timeout)
+            self.port.rts = False
+            self.port.dtr = False
+            self.port.setPort(device)
+            self.port.open()
+
+        # 舵机读请求: (功能码, 舵机ID, 命令) -> 等待回复的 [截止时间, future, 解包格式] 队列
+        # 同一个键可以有多个请求在途, 回复按发送顺序依次匹配
+        self.read_timeout = read_timeout
+        self.pending_reads = {}
+        self.pending_lock = threading.Lock()
+        self.next_read_deadline = None
+
+        # 遥测数据按时间戳保存在环形缓冲区里, 不再只保留一个样本
+        capacity = self.telemetry_capacity
+        self.sys_ring = TelemetryRing(capacity['sys'], (8,))
+        self.key_ring = TelemetryRing(capacity['key'], (2,))
+        self.imu_ring = TelemetryRing(capacity['imu'], (6,), np.float32)  # ax, ay, az, gx, gy, gz
+        self.gamepad_ring = TelemetryRing(capacity['gamepad'], (7,))
+        self.sbus_ring = TelemetryRing(capacity['sbus'], (36,))
+        # get_* 只返回上次调用之后到达的数据
+        self.get_cursors = {}
+        self.recv_stamp = 0.0
+
+        # IMU 突发解码: 原始载荷拷进预分配的缓冲区, 用 np.frombuffer 的视图一次解码整批
+        self.imu_raw = bytearray(24 * self.imu_burst_samples)
+        self.imu_block = np.frombuffer(self.imu_raw, '<f4').reshape(-1, 6)
+        self.imu_block_stamps = np.empty(self.imu_burst_samples, np.float64)
+        self.imu_steps = np.arange(self.imu_burst_samples - 1, -1, -1, dtype=np.float64)
+        self.imu_pending = 0
+        self.imu_period = 0.0  # 估计的 IMU 采样周期
+        self.imu_last_stamp = 0.0
+        self.imu_callbacks = []
+        self.imu_cond = threading.Condition()
 
         self.parsers = {
             PacketFunction.PACKET_FUNC_SYS: self.packet_report_sys,
@@ -130,244 +322,765 @@ class Board:
             PacketFunction.PACKET_FUNC_PWM_SERVO: self.packet_report_pwm_servo
         }
 
-        threading.Thread(target=self.recv_task, daemon=True).start()
-        time.sleep(0.1)
+        # 发送调度: 同一执行器在一个控制周期内只发最后一次的值, 每个周期一次串口写
+        # tx_latest: 执行器键 -> (分组, 数据), 分组相同的执行器合并成一帧
+        # tx_queues: 功能码(总线) -> 按顺序发送的 [帧, 间隔, future]
+        # tx_ready_at: 总线在该时间之前不能再发命令(如舵机写 EEPROM)
+        self.tx_interval = tx_interval
+        self.tx_cond = threading.Condition()
+        self.tx_latest = {}
+        self.tx_queues = collections.defaultdict(collections.deque)
+        self.tx_ready_at = {}
+        self.tx_settling = []  # 间隔结束后才完成的 (时间, future)
+        self.tx_urgent = False
+        self.tx_busy = False
+        self.tx_running = False
+        self.tx_thread = None
+        self.tx_last_write = 0.0
+        self.tx_history = collections.deque()  # 最近一秒的 (时间, 字节数)
+        # 每次发送都把帧直接打包进这块复用的缓冲区
+        self.tx_buf = bytearray(1024)
+        self.tx_view = memoryview(self.tx_buf)
+        self.tx_stats = {'bytes': 0, 'frames': 0, 'writes': 0, 'coalesced': 0}
+
+        # 唤醒管道: enable_reception() 和 stop() 通过它打断接收线程的等待
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        os.set_blocking(self.wakeup_w, False)
+        self.running = False
+        self.recv_thread = None
+        self.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """Start the receive and transmit threads (done by __init__)."""
+        if self.tx_thread is None:
+            self.tx_running = True
+            self.tx_thread = threading.Thread(target=self.tx_task, daemon=True)
+            self.tx_thread.start()
+            # 程序退出前把还没发出去的命令发完(例如停止电机)
+            atexit.register(self.flush, 1.0)
+        if self.recv_thread is not None:
+            return
+        self.running = True
+        self.recv_thread = threading.Thread(target=self.recv_task, daemon=True)
+        self.recv_thread.start()
+
+    def stop(self):
+        """Flush pending commands and stop both threads; the port stays open.
+
+        Reads still waiting for a reply, and reads started while stopped,
+        fail with TimeoutError.
+        """
+        if self.tx_thread is not None:
+            self.flush(1.0)
+            with self.tx_cond:
+                self.tx_running = False
+                self.tx_cond.notify_all()
+            if self.tx_thread is not threading.current_thread():
+                self.tx_thread.join()
+            self.tx_thread = None
+            atexit.unregister(self.flush)
+        if self.recv_thread is None:
+            return
+        self.running = False
+        self._wakeup()
+        if self.recv_thread is not threading.current_thread():
+            self.recv_thread.join()
+        self.recv_thread = None
+        self._expire_reads(float('inf'))
+        with self.imu_cond:
+            self.imu_cond.notify_all()
+
+    def close(self):
+        """Send pending commands, stop the threads and close the serial port."""
+        self.stop()
+        if self.port.is_open:
+            self.port.close()
+        for fd in (self.wakeup_r, self.wakeup_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.wakeup_r = self.wakeup_w = -1
 
-    def packet_report_sys(self, data):
+    def _wakeup(self):
         try:
-            self.sys_queue.put_nowait(data)
-        except queue.Full:
+            os.write(self.wakeup_w, b'\0')
+        except OSError:
+            # 管道已满说明线程已经会被唤醒
             pass
 
+    def packet_report_sys(self, data):
+        self.sys_ring.append_bytes(data, self.recv_stamp)
+
     def packet_report_key(self, data):
-        try:
-            self.key_queue.put_nowait(data)
-        except queue.Full:
-            pass
+        self.key_ring.append_bytes(data, self.recv_stamp)
 
     def packet_report_imu(self, data):
-        try:
-            self.imu_queue.put_nowait(data)
-        except queue.Full:
-            pass
+        if len(data) < 24:
+            return
+        offset = self.imu_pending * 24
+        self.imu_raw[offset:offset + 24] = data[:24]
+        self.imu_pending += 1
+        if self.imu_pending == self.imu_burst_samples:
+            self._flush_imu(self.recv_stamp)
+
+    def _flush_imu(self, stamp):
+        # 把这次读到的 IMU 样本作为一个块写入环形缓冲区并交给订阅者
+        n = self.imu_pending
+        if n == 0:
+            return
+        self.imu_pending = 0
+        samples = self.imu_block[:n]
+        stamps = self.imu_block_stamps[:n]
+        # 最后一个样本记为读到的时间, 之前的按估计的采样周期往前推
+        if self.imu_last_stamp:
+            observed = (stamp - self.imu_last_stamp) / n
+            if observed < 0.1:
+                if self.imu_period:
+                    self.imu_period += 0.05 * (observed - self.imu_period)
+                else:
+                    self.imu_period = observed
+        np.multiply(self.imu_steps[-n:], -self.imu_period, out=stamps)
+        stamps += stamp
+        np.maximum(stamps, self.imu_last_stamp, out=stamps)
+        self.imu_last_stamp = stamp
+        self.imu_ring.extend(samples, stamps)
+        for callback in list(self.imu_callbacks):
+            try:
+                callback(stamps, samples)
+            except Exception as e:
+                print("IMU 回调错误:", e)
+        with self.imu_cond:
+            self.imu_cond.notify_all()
+
+    def add_imu_callback(self, callback):
+        """
+        Call callback(stamps, samples) in the receive thread for every IMU block.
+
+        samples is an (N, 6) float32 array of ax, ay, az, gx, gy, gz and stamps
+        the host time.time() of each sample. Both are views of reused buffers,
+        valid only during the call: copy what must be kept, and return quickly.
+        """
+        self.imu_callbacks.append(callback)
+
+    def remove_imu_callback(self, callback):
+        self.imu_callbacks.remove(callback)
+
+    def imu_blocks(self, timeout=None, min_samples=1):
+        """
+        Iterate over IMU blocks as (stamps, samples[N, 6]) copies.
+
+        Starts with samples arriving after the call and never skips any unless
+        the caller falls more than a ring capacity behind. Ends after timeout
+        seconds without data, or when the board stops.
+
+        Args:
+            timeout: Seconds to wait for new samples, None to wait forever
+            min_samples: Gather at least this many samples per block
+        """
+        ring = self.imu_ring
+        cursor = ring.count
+        while self.running:
+            with self.imu_cond:
+                if not self.imu_cond.wait_for(lambda: ring.count - cursor >= min_samples or not self.running,
+                                              timeout):
+                    return
+            if not self.running:
+                return
+            cursor, stamps, samples = ring.read_from(cursor)
+            yield stamps, samples
 
     def packet_report_gamepad(self, data):
-        try:
-            self.gamepad_queue.put_nowait(data)
-        except queue.Full:
-            pass
+        self.gamepad_ring.append_bytes(data, self.recv_stamp)
 
     def packet_report_serial_servo(self, data):
-        try:
-            self.bus_servo_queue.put_nowait(data)
-        except queue.Full:
-            pass
+        self._resolve_read(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
 
     def packet_report_pwm_servo(self, data):
-        try:
-            self.pwm_servo_queue.put_nowait(data)
-        except queue.Full:
-            pass
+        self._resolve_read(PacketFunction.PACKET_FUNC_PWM_SERVO, data)
 
     def packet_report_sbus(self, data):
-        try:
-            self.sbus_queue.put_nowait(data)
-        except queue.Full:
-            pass
+        self.sbus_ring.append_bytes(data, self.recv_stamp)
+
+    def _take_latest(self, name, ring):
+        # 取上次调用之后最新的一个样本
+        count = ring.count
+        if count == self.get_cursors.get(name, 0):
+            return None
+        self.get_cursors[name] = count
+        return ring.latest()[1]
+
+    def _take_next(self, name, ring):
+        # 按顺序取下一个未读样本, 按键事件不能丢
+        cursor, _, samples = ring.read_from(self.get_cursors.get(name, 0))
+        if len(samples) == 0:
+            return None
+        self.get_cursors[name] = cursor - len(samples) + 1
+        return samples[0]
+
+    def get_imu_history(self, n=None, since=None):
+        """
+        Buffered IMU samples as (stamps, samples[N, 6]) float arrays.
+
+        Args:
+            n: Return the last n samples
+            since: Return samples stamped after this time.time() value
+        """
+        if since is not None:
+            return self.imu_ring.since(since)
+        return self.imu_ring.last(self.imu_ring.capacity if n is None else n)
 
     def get_battery(self):
         if self.enable_recv:
-            try:
-                data = self.sys_queue.get(block=False)
-                if data[0] == 0x04:
-                    return struct.unpack('<H', data[1:])[0]
-                else:
-                    None
-            except queue.Empty:
-                return None
+            data = self._take_latest('sys', self.sys_ring)
+            if data is not None and data[0] == 0x04:
+                return int(data[1]) | int(data[2]) << 8
+            return None
         else:
             # print('enable reception first!')
             return None
 
     def get_button(self):
         if self.enable_recv:
-            try:
-                data = self.key_queue.get(block=False)
-                key_id = data[0]
-                key_event = PacketReportKeyEvents(data[1])
-                if key_event == PacketReportKeyEvents.KEY_EVENT_CLICK:
-                    return key_id, 0
-                elif key_event == PacketReportKeyEvents.KEY_EVENT_PRESSED:
-                    return key_id, 1
-            except queue.Empty:
+            data = self._take_next('key', self.key_ring)
+            if data is None:
                 return None
+            key_id = int(data[0])
+            key_event = PacketReportKeyEvents(data[1])
+            if key_event == PacketReportKeyEvents.KEY_EVENT_CLICK:
+                return key_id, 0
+            elif key_event == PacketReportKeyEvents.KEY_EVENT_PRESSED:
+                return key_id, 1
         else:
             # print('enable reception first!')
             return None
 
     def get_imu(self):
         if self.enable_recv:
-            try:
-                # ax, ay, az, gx, gy, gz
-                return struct.unpack('<6f', self.imu_queue.get(block=False))
-            except queue.Empty:
+            # ax, ay, az, gx, gy, gz
+            data = self._take_latest('imu', self.imu_ring)
+            if data is None:
                 return None
+            return tuple(data.tolist())
         else:
             # print('enable reception first!')
             return None
 
     def get_gamepad(self):
         if self.enable_recv:
-            try:
-                # buttons, hat, lx, ly, rx, ry
-                gamepad_data = struct.unpack("<HB4b", self.gamepad_queue.get(block=False))
-                # 'lx', 'ly', 'rx', 'ry', 'r2', 'l2', 'hat_x', 'hat_y'
-                axes = [0, 0, 0, 0, 0, 0, 0, 0]
-                # 'cross', 'circle', '', 'square', 'triangle', '', 'l1', 'r1', 'l2', 'r2', 'select', 'start', '', 'l3', 'r3', ''
-                buttons = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0] 
-                for b in self.buttons_map:
-                    if self.buttons_map[b] & gamepad_data[0]:
-                        if b == 'GAMEPAD_BUTTON_MASK_R2':
-                            axes[4] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_L2':
-                            axes[5] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_CROSS':
-                            buttons[0] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_CIRCLE':
-                            buttons[1] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_SQUARE':
-                            buttons[3] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_TRIANGLE':
-                            buttons[4] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_L1':
-                            buttons[6] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_R1':
-                            buttons[7] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_SELECT':
-                            buttons[10] = 1
-                        elif b == 'GAMEPAD_BUTTON_MASK_START':
-                            buttons[11] = 1
-               
-                if gamepad_data[2] > 0:
-                    axes[0] = -gamepad_data[2] / 127
-                elif gamepad_data[2] < 0:
-                    axes[0] = -gamepad_data[2] / 128
-
-                if gamepad_data[3] > 0:
-                    axes[1] = gamepad_data[3] / 127
-                elif gamepad_data[3] < 0:
-                    axes[1] = gamepad_data[3] / 128
-
-                if gamepad_data[4] > 0:
-                    axes[2] = -gamepad_data[4] / 127
-                elif gamepad_data[4] < 0:
-                    axes[2] = -gamepad_data[4] / 128
-
-                if gamepad_data[5] > 0:
-                    axes[3] = gamepad_data[5] / 127
-                elif gamepad_data[5] < 0:
-                    axes[3] = gamepad_data[5] / 128
-            
-                if gamepad_data[1] == 9:
-                    axes[6] = 1
-                elif gamepad_data[1] == 13:
-                    axes[6] = -1
-                
-                if gamepad_data[1] == 11:
-                    axes[7] = -1
-                elif gamepad_data[1] == 15:
-                    axes[7] = 1
-                return axes, buttons
-            except queue.Empty:
+            # buttons, hat, lx, ly, rx, ry
+            data = self._take_latest('gamepad', self.gamepad_ring)
+            if data is None:
                 return None
+            gamepad_data = packer("<HB4b").unpack(data)
+            # 'lx', 'ly', 'rx', 'ry', 'r2', 'l2', 'hat_x', 'hat_y'
+            axes = [0, 0, 0, 0, 0, 0, 0, 0]
+            # 'cross', 'circle', '', 'square', 'triangle', '', 'l1', 'r1', 'l2', 'r2', 'select', 'start', '', 'l3', 'r3', ''
+            buttons = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0] 
+            for b in self.buttons_map:
+                if self.buttons_map[b] & gamepad_data[0]:
+                    if b == 'GAMEPAD_BUTTON_MASK_R2':
+                        axes[4] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_L2':
+                        axes[5] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_CROSS':
+                        buttons[0] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_CIRCLE':
+                        buttons[1] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_SQUARE':
+                        buttons[3] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_TRIANGLE':
+                        buttons[4] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_L1':
+                        buttons[6] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_R1':
+                        buttons[7] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_SELECT':
+                        buttons[10] = 1
+                    elif b == 'GAMEPAD_BUTTON_MASK_START':
+                        buttons[11] = 1
+           
+            if gamepad_data[2] > 0:
+                axes[0] = -gamepad_data[2] / 127
+            elif gamepad_data[2] < 0:
+                axes[0] = -gamepad_data[2] / 128
+
+            if gamepad_data[3] > 0:
+                axes[1] = gamepad_data[3] / 127
+            elif gamepad_data[3] < 0:
+                axes[1] = gamepad_data[3] / 128
+
+            if gamepad_data[4] > 0:
+                axes[2] = -gamepad_data[4] / 127
+            elif gamepad_data[4] < 0:
+                axes[2] = -gamepad_data[4] / 128
+
+            if gamepad_data[5] > 0:
+                axes[3] = gamepad_data[5] / 127
+            elif gamepad_data[5] < 0:
+                axes[3] = gamepad_data[5] / 128
+        
+            if gamepad_data[1] == 9:
+                axes[6] = 1
+            elif gamepad_data[1] == 13:
+                axes[6] = -1
+            
+            if gamepad_data[1] == 11:
+                axes[7] = -1
+            elif gamepad_data[1] == 15:
+                axes[7] = 1
+            return axes, buttons
         else:
             # print('enable reception first!')
             return None
 
     def get_sbus(self):
         if self.enable_recv:
-            try:
-                sbus_data = self.sbus_queue.get(block=False)
-                status = SBusStatus()
-                *status.channels, ch17, ch18, sig_loss, fail_safe = struct.unpack("<16hBBBB", sbus_data)
-                status.channel_17 = ch17 != 0
-                status.channel_18 = ch18 != 0
-                status.signal_loss = sig_loss != 0
-                status.fail_safe = fail_safe != 0
-                data = []
-                if status.signal_loss:
-                    data = 16 * [0.5]
-                    data[4] = 0
-                    data[5] = 0
-                    data[6] = 0
-                    data[7] = 0
-                else:
-                    for i in status.channels:
-                        data.append((i - 192)/(1792 - 192))
-                return data
-            except queue.Empty:
+            sbus_data = self._take_latest('sbus', self.sbus_ring)
+            if sbus_data is None:
                 return None
+            status = SBusStatus()
+            *status.channels, ch17, ch18, sig_loss, fail_safe = packer("<16hBBBB").unpack(sbus_data)
+            status.channel_17 = ch17 != 0
+            status.channel_18 = ch18 != 0
+            status.signal_loss = sig_loss != 0
+            status.fail_safe = fail_safe != 0
+            data = []
+            if status.signal_loss:
+                data = 16 * [0.5]
+                data[4] = 0
+                data[5] = 0
+                data[6] = 0
+                data[7] = 0
+            else:
+                for i in status.channels:
+                    data.append((i - 192)/(1792 - 192))
+            return data
         else:
             # print('enable reception first!')
             return None
 
-    def buf_write(self, func, data):
-        buf = [0xAA, 0x55, int(func)]
-        buf.append(len(data))
-        buf.extend(data)
-        buf.append(checksum_crc8(bytes(buf[2:])))
-        self.port.write(buf)
-
+    def buf_write(self, func, data, urgent=False):
+        """Queue raw data bytes behind every earlier command for the same function."""
+        self.send_command(func, packer("<%ds" % len(data)), (bytes(data),), urgent)
+
+    def send_command(self, func, payload, values, urgent=False, gap=0.0, future=None):
+        """
+        Queue a frame on the bus of its function code.
+
+        The frame is only packed, straight into the transmit buffer, when it
+        is written.
+
+        Args:
+            func: PacketFunction
+            payload: struct.Struct of the data (see packer())
+            values: Values for payload
+            urgent: Send without waiting for the next control tick
+            gap: Seconds the bus must stay quiet after this frame
+            future: Optional Future, resolved once the frame is written and
+                    its gap has passed, or failed with the write error
+
+        Returns:
+            The future passed in
+
+        Raises:
+            struct.error: If values do not fit payload
+        """
+        # 帧在发送线程里才打包, 先在调用者线程检查数值, 错误仍由调用者收到
+        payload.pack(*values)
+        with self.tx_cond:
+            # 先把已合并的命令封成帧, 保证顺序不被打乱
+            self._seal_latest()
+            self.tx_queues[int(func)].append((payload, values, gap, future))
+            self.tx_urgent = self.tx_urgent or urgent
+            self.tx_cond.notify_all()
+        return future
+
+    def send_latest(self, key, group, item):
+        """
+        Queue a command that supersedes any unsent one for the same actuator.
+
+        Args:
+            key: Actuator, e.g. ('motor', 1)
+            group: (function, header format, header values, item format);
+                   items of the same group go out as one frame "header,
+                   count, items..." packed by a single Struct. None: item is
+                   a whole frame (function, payload Struct, values).
+            item: Per-actuator values (or the whole frame)
+
+        Raises:
+            struct.error: If the values do not fit their format
+        """
+        if group is None:
+            item[1].pack(*item[2])
+        else:
+            packer("<" + group[3]).pack(*item)
+        with self.tx_cond:
+            if self.tx_latest.pop(key, None) is not None:
+                self.tx_stats['coalesced'] += 1
+            self.tx_latest[key] = (group, item)
+            self.tx_cond.notify_all()
+
+    def _seal_latest(self):
+        # 调用者持有 tx_cond
+        if not self.tx_latest:
+            return
+        groups = {}
+        for group, item in self.tx_latest.values():
+            if group is None:
+                func, payload, values = item
+                self.tx_queues[int(func)].append((payload, values, 0.0, None))
+            else:
+                groups.setdefault(group, []).append(item)
+        for (func, head_fmt, head_values, item_fmt), items in groups.items():
+            # 多个执行器用一个 Struct 一次打包
+            payload = packer(head_fmt + "B" + item_fmt * len(items))
+            values = head_values + (len(items),) + tuple(itertools.chain.from_iterable(items))
+            self.tx_queues[int(func)].append((payload, values, 0.0, None))
+        self.tx_latest.clear()
+
+    def _tx_pending(self):
+        return bool(self.tx_latest) or any(self.tx_queues.values())
+
+    def _take_ready(self, now):
+        # 从每条总线取出可以发送的帧; 返回 (帧列表, 带间隔的条目, 最早的解除等待时间)
+        frames, sent, next_ready = [], [], None
+        for func, pending in self.tx_queues.items():
+            while pending:
+                ready_at = self.tx_ready_at.get(func, 0.0)
+                if ready_at > now:
+                    if next_ready is None or ready_at < next_ready:
+                        next_ready = ready_at
+                    break
+                payload, values, gap, future = pending.popleft()
+                frames.append((func, payload, values, future))
+                if gap or future is not None:
+                    sent.append((func, gap, future))
+                if gap:
+                    # 间隔结束前这条总线不再发送
+                    self.tx_ready_at[func] = float('inf')
+                    break
+        return frames, sent, next_ready
+
+    def _settle_due(self, now):
+        # 调用者持有 tx_cond; 返回到期的 future 和下一个到期时间
+        due = [future for t, future in self.tx_settling if t <= now]
+        self.tx_settling = [(t, future) for t, future in self.tx_settling if t > now]
+        next_due = min((t for t, _ in self.tx_settling), default=None)
+        return due, next_due
+
+    def flush(self, timeout=None):
+        """Send everything queued now and wait until it is written; False on timeout."""
+        with self.tx_cond:
+            if self.tx_thread is None:
+                return not self._tx_pending()
+            self.tx_urgent = True
+            self.tx_cond.notify_all()
+            return self.tx_cond.wait_for(lambda: not (self._tx_pending() or self.tx_busy), timeout)
+
+    def link_stats(self):
+        """
+        Transmit counters and the share of the UART used over the last second.
+
+        Returns:
+            dict: bytes, frames, writes, coalesced (superseded commands never
+            sent) and utilization (0-1, 10 bits per byte on the wire)
+        """
+        with self.tx_cond:
+            self._trim_history(time.monotonic())
+            stats = dict(self.tx_stats)
+            sent = sum(n for _, n in self.tx_history)
+        stats['utilization'] = sent * 10 / self.port.baudrate
+        return stats
+
+    def _trim_history(self, now):
+        while self.tx_history and self.tx_history[0][0] < now - 1.0:
+            self.tx_history.popleft()
+
+    def tx_task(self):
+        while True:
+            frames, exiting = None, False
+            with self.tx_cond:
+                while True:
+                    now = time.monotonic()
+                    due, next_due = self._settle_due(now)
+                    if due:
+                        break
+                    wake_at = next_due
+                    if not self._tx_pending():
+                        if not self.tx_running:
+                            # 退出前完成剩余的 future
+                            due = [future for _, future in self.tx_settling]
+                            self.tx_settling = []
+                            exiting = True
+                            break
+                    else:
+                        # 等到下一个控制周期, 期间到来的命令继续合并
+                        tick = self.tx_last_write + self.tx_interval
+                        if now < tick and not self.tx_urgent and self.tx_running:
+                            wake_at = tick if wake_at is None else min(wake_at, tick)
+                        else:
+                            self._seal_latest()
+                            frames, sent, next_ready = self._take_ready(now)
+                            if frames:
+                                self.tx_urgent = False
+                                self.tx_busy = True
+                                break
+                            if next_ready is not None:
+                                wake_at = next_ready if wake_at is None else min(wake_at, next_ready)
+                    self.tx_cond.wait(None if wake_at is None else wake_at - now)
+            for future in due:
+                self._settle(future)
+            if exiting:
+                return
+            if frames:
+                try:
+                    self._tx_write(frames, sent)
+                except Exception as e:
+                    # 一批帧出错不能让发送线程退出, 否则之后的命令(例如停止电机)都发不出去
+                    print("发送线程错误:", e)
+                    self._tx_abort(sent, e)
+
+    def _tx_write(self, frames, sent):
+        size = sum(frame[1].size + 5 for frame in frames)
+        if size > len(self.tx_buf):
+            self.tx_view.release()
+            self.tx_buf = bytearray(size * 2)
+            self.tx_view = memoryview(self.tx_buf)
+        end = 0
+        failed = {}
+        for func, payload, values, future in frames:
+            try:
+                end = pack_frame_into(self.tx_view, end, func, payload, values)
+            except (struct.error, TypeError) as e:
+                # 打包失败的帧丢弃, 其余帧照常发送
+                print("打包错误:", e)
+                if future is not None:
+                    failed[future] = e
+        error = None
+        try:
+            self.port.write(self.tx_view[:end])
+        except (OSError, serial.SerialException) as e:
+            print("发送错误:", e)
+            error = e
+        now = time.monotonic()
+        done = []
+        with self.tx_cond:
+            for func, gap, future in sent:
+                if gap:
+                    self.tx_ready_at[func] = now + gap
+                if future is None:
+                    continue
+                exception = failed.get(future, error)
+                if gap and exception is None:
+                    self.tx_settling.append((now + gap, future))
+                else:
+                    # 写失败的 future 立即失败, 不等总线间隔
+                    done.append((future, exception))
+            self.tx_busy = False
+            self.tx_last_write = now
+            self.tx_history.append((now, end))
+            self._trim_history(now)
+            self.tx_stats['bytes'] += end
+            self.tx_stats['frames'] += len(frames)
+            self.tx_stats['writes'] += 1
+            self.tx_cond.notify_all()
+        for future, exception in done:
+            self._settle(future, exception=exception)
+
+    def _tx_abort(self, sent, error):
+        # 发送一批帧时出现意外错误: 让这批的 future 失败, 总线间隔照常生效
+        now = time.monotonic()
+        with self.tx_cond:
+            for func, gap, _ in sent:
+                if gap:
+                    self.tx_ready_at[func] = now + gap
+            self.tx_busy = False
+            self.tx_last_write = now
+            self.tx_cond.notify_all()
+        for _, _, future in sent:
+            if future is not None:
+                self._settle(future, exception=error)
+
+    # 以下控制命令按执行器合并, 一个周期内被覆盖的值不会发出
     def set_led(self, on_time, off_time, repeat=1, led_id=1):
         on_time = int(on_time*1000)
         off_time = int(off_time*1000)
-        self.buf_write(PacketFunction.PACKET_FUNC_LED, struct.pack("<BHHH", led_id, on_time, off_time, repeat))
+        self.send_latest(('led', led_id), None,
+                         (PacketFunction.PACKET_FUNC_LED, packer("<BHHH"), (led_id, on_time, off_time, repeat)))
 
     def set_buzzer(self, freq, on_time, off_time, repeat=1):
         on_time = int(on_time*1000)
         off_time = int(off_time*1000)
-        self.buf_write(PacketFunction.PACKET_FUNC_BUZZER, struct.pack("<HHHH", freq, on_time, off_time, repeat))
+        self.send_latest(('buzzer',), None,
+                         (PacketFunction.PACKET_FUNC_BUZZER, packer("<HHHH"), (freq, on_time, off_time, repeat)))
 
     def set_motor_speed(self, speeds):
-        data = [0x01, len(speeds)]
+        group = (PacketFunction.PACKET_FUNC_MOTOR, "<B", (0x01,), "Bf")
         for i in speeds:
-            data.extend(struct.pack("<Bf", int(i[0] - 1), float(i[1])))
-        self.buf_write(PacketFunction.PACKET_FUNC_MOTOR, data)
+            self.send_latest(('motor', int(i[0])), group, (int(i[0] - 1), float(i[1])))
 
     def set_oled_text(self, line, text):
-        data = [line, len(text)] # 子命令为 0x01 设置 SSID, 第二个字节是字符串长度，该长度包含'\0'字符串结束符
-        data.extend(bytes(text, encoding='utf-8'))
-        self.buf_write(PacketFunction.PACKET_FUNC_OLED, data)
+        data = bytes(text, encoding='utf-8')
+        # 子命令为 0x01 设置 SSID, 第二个字节是字符串长度，该长度包含'\0'字符串结束符
+        self.send_latest(('oled', line), None,
+                         (PacketFunction.PACKET_FUNC_OLED, packer("<BB%ds" % len(data)), (line, len(text), data)))
 
     def set_rgb(self, pixels):
-        data = [0x01, len(pixels), ]
+        group = (PacketFunction.PACKET_FUNC_RGB, "<B", (0x01,), "BBBB")
         for index, r, g, b in pixels:
-            data.extend(struct.pack("<BBBB", int(index - 1), int(r), int(g), int(b)))
-        self.buf_write(PacketFunction.PACKET_FUNC_RGB, data)
+            self.send_latest(('rgb', int(index)), group, (int(index - 1), int(r), int(g), int(b)))
 
     def set_motor_duty(self, dutys):
-        data = [0x05, len(dutys)]
+        # 同一电机的速度和占空比命令互相覆盖
+        group = (PacketFunction.PACKET_FUNC_MOTOR, "<B", (0x05,), "Bf")
         for i in dutys:
-            data.extend(struct.pack("<Bf", int(i[0] - 1), float(i[1])))
-        self.buf_write(PacketFunction.PACKET_FUNC_MOTOR, data)
+            self.send_latest(('motor', int(i[0])), group, (int(i[0] - 1), float(i[1])))
 
     def pwm_servo_set_position(self, duration, positions):
-        duration = int(duration * 1000)
-        data = [0x01, duration & 0xFF, 0xFF & (duration >> 8), len(positions)]
+        duration = int(duration * 1000) & 0xFFFF
+        group = (PacketFunction.PACKET_FUNC_PWM_SERVO, "<BH", (0x01, duration), "BH")
         for i in positions:
-            data.extend(struct.pack("<BH", i[0], i[1]))
-        self.buf_write(PacketFunction.PACKET_FUNC_PWM_SERVO, data)
+            self.send_latest(('pwm_servo', int(i[0])), group, (i[0], i[1]))
     
     def pwm_servo_set_offset(self, servo_id, offset):
-        data = struct.pack("<BBb", 0x07, servo_id, int(offset))
-        self.buf_write(PacketFunction.PACKET_FUNC_PWM_SERVO, data)
+        self.send_command(PacketFunction.PACKET_FUNC_PWM_SERVO, packer("<BBb"), (0x07, servo_id, int(offset)))
+
+    def servo_read_async(self, func, servo_id, cmd, unpack, timeout=None):
+        """Send a servo read request without waiting for the reply.
+
+        Args:
+            func: PACKET_FUNC_BUS_SERVO or PACKET_FUNC_PWM_SERVO
+            servo_id: Servo ID (254 broadcasts to the single servo on the bus)
+            cmd: Read sub-command
+            unpack: struct format of the reply
+            timeout: Seconds to wait for the reply (default: read_timeout)
+
+        Returns:
+            concurrent.futures.Future: Resolves to the decoded reply, None if
+            the servo reports an error, or fails with TimeoutError (also at
+            once when the board is stopped) or the error of the failed write.
+        """
+        if timeout is None:
+            timeout = self.read_timeout
+        future = futures.Future()
+        key = (int(func), servo_id, cmd)
+        # 请求可能排在总线间隔之后, 超时从真正发出时开始计算
+        entry = [float('inf'), future, unpack]
+        sent = futures.Future()
+        sent.add_done_callback(lambda f: self._arm_read(key, entry, timeout, f))
+        # 持有 tx_cond 检查发送线程, 保证请求入队后一定会被发出或失败
+        with self.tx_cond:
+            if not self.tx_running:
+                self._settle(future, exception=futures.TimeoutError("board is stopped"))
+                return future
+            with self.pending_lock:
+                self.pending_reads.setdefault(key, collections.deque()).append(entry)
+            self.send_command(func, packer("<BB"), (cmd, servo_id), urgent=True, future=sent)
+        return future
+
+    def _arm_read(self, key, entry, timeout, sent):
+        error = sent.exception()
+        if error is not None:
+            # 请求没发出去, 不会有回复
+            with self.pending_lock:
+                pending = self.pending_reads.get(key, ())
+                for i, other in enumerate(pending):
+                    if other is entry:
+                        del pending[i]
+                        break
+                if key in self.pending_reads and not pending:
+                    del self.pending_reads[key]
+            self._settle(entry[1], exception=error)
+            return
+        deadline = time.monotonic() + timeout
+        with self.pending_lock:
+            entry[0] = deadline
+            wake = self.next_read_deadline is None or deadline < self.next_read_deadline
+            if wake:
+                self.next_read_deadline = deadline
+        if wake:
+            # 让接收线程按新的截止时间等待
+            self._wakeup()
+
+    @staticmethod
+    def servo_read_result(future):
+        """Wait for a servo read future; None on error or timeout."""
+        try:
+            return future.result()
+        except (futures.TimeoutError, futures.CancelledError):
+            return None
+
+    def _resolve_read(self, func, data):
+        if len(data) < 2:
+            return
+        servo_id, cmd = data[0], data[1]
+        with self.pending_lock:
+            key = (int(func), servo_id, cmd)
+            pending = self.pending_reads.get(key)
+            if not pending:
+                # 广播读 ID 时回复里是舵机的真实 ID
+                key = (int(func), 254, cmd)
+                pending = self.pending_reads.get(key)
+                if not pending:
+                    return
+            _, future, unpack = pending.popleft()
+            if not pending:
+                del self.pending_reads[key]
+        try:
+            if func == PacketFunction.PACKET_FUNC_BUS_SERVO:
+                servo_id, cmd, success, *info = packer(unpack).unpack(data)
+                result = info if success == 0 else None
+            else:
+                servo_id, cmd, result = packer(unpack).unpack(data)
+        except struct.error as e:
+            self._settle(future, exception=e)
+            return
+        self._settle(future, result)
+
+    def _expire_reads(self, now):
+        """Fail reads whose deadline passed; returns the next deadline or None."""
+        expired = []
+        next_deadline = None
+        with self.pending_lock:
+            for key in list(self.pending_reads):
+                pending = self.pending_reads[key]
+                while pending and pending[0][0] <= now:
+                    expired.append(pending.popleft()[1])
+                if pending:
+                    deadline = min(entry[0] for entry in pending)
+                    if deadline != float('inf') and (next_deadline is None or deadline < next_deadline):
+                        next_deadline = deadline
+                else:
+                    del self.pending_reads[key]
+            self.next_read_deadline = next_deadline
+        for future in expired:
+            self._settle(future, exception=futures.TimeoutError("servo read timed out"))
+        return next_deadline
+
+    @staticmethod
+    def _settle(future, result=None, exception=None):
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except futures.InvalidStateError:
+            # 调用者已经取消
+            pass
+
+    def pwm_servo_read_async(self, servo_id, cmd, unpack, timeout=None):
+        return self.servo_read_async(PacketFunction.PACKET_FUNC_PWM_SERVO, servo_id, cmd, unpack, timeout)
 
-    def pwm_servo_read_and_unpack(self, servo_id, cmd, unpack):
-        with self.servo_read_lock:
-            self.buf_write(PacketFunction.PACKET_FUNC_PWM_SERVO, [cmd, servo_id])
-            data = self.pwm_servo_queue.get(block=True)
-            servo_id, cmd, info = struct.unpack(unpack, data)
-            return info
+    def pwm_servo_read_and_unpack(self, servo_id, cmd, unpack, timeout=None):
+        return self.servo_read_result(self.pwm_servo_read_async(servo_id, cmd, unpack, timeout))
 
     def pwm_servo_read_offset(self, servo_id):
         return self.pwm_servo_read_and_unpack(servo_id, 0x09, "<BBb")
@@ -375,63 +1088,74 @@ class Board:
     def pwm_servo_read_position(self, servo_id):
         return self.pwm_servo_read_and_unpack(servo_id, 0x05, "<BBH")
 
+    def bus_servo_write(self, fmt, *values):
+        """
+        Queue a bus servo setting without blocking the caller.
+
+        The board needs bus_servo_gap seconds after each setting before the
+        next bus servo command; the transmit thread holds back later bus servo
+        frames until then while other functions keep flowing.
+
+        Returns:
+            concurrent.futures.Future: Done once the setting is written and the
+            gap has passed
+        """
+        return self.send_command(PacketFunction.PACKET_FUNC_BUS_SERVO, packer(fmt), values,
+                                 gap=self.bus_servo_gap, future=futures.Future())
+
     def bus_servo_enable_torque(self, servo_id, enable):
-        if enable:
-            data = struct.pack("<BB", 0x0B, servo_id)
-        else:
-            data = struct.pack("<BB", 0x0C, servo_id)
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
-        time.sleep(0.02)
+        return self.bus_servo_write("<BB", 0x0B if enable else 0x0C, servo_id)
 
     def bus_servo_set_id(self, servo_id_now, servo_id_new):
-        data = struct.pack("<BBB", 0x10, servo_id_now, servo_id_new)
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
-        time.sleep(0.02)
+        return self.bus_servo_write("<BBB", 0x10, servo_id_now, servo_id_new)
 
     def bus_servo_set_offset(self, servo_id, offset):
-        data = struct.pack("<BBb", 0x20, servo_id, int(offset))
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
-        time.sleep(0.02)
+        return self.bus_servo_write("<BBb", 0x20, servo_id, int(offset))
 
     def bus_servo_save_offset(self, servo_id):
-        data = struct.pack("<BB", 0x24, servo_id)
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
-        time.sleep(0.02)
+        return self.bus_servo_write("<BB", 0x24, servo_id)
 
     def bus_servo_set_angle_limit(self, servo_id, limit):
-        data = struct.pack("<BBHH", 0x30, servo_id, int(limit[0]), int(limit[1]))
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
-        time.sleep(0.02)
+        return self.bus_servo_write("<BBHH", 0x30, servo_id, int(limit[0]), int(limit[1]))
 
     def bus_servo_set_vin_limit(self, servo_id, limit):
-        data = struct.pack("<BBHH", 0x34, servo_id, int(limit[0]), int(limit[1]))
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
-        time.sleep(0.02)
+        return self.bus_servo_write("<BBHH", 0x34, servo_id, int(limit[0]), int(limit[1]))
 
     def bus_servo_set_temp_limit(self, servo_id, limit):
-        data = struct.pack("<BBb", 0x38, servo_id, int(limit))
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
-        time.sleep(0.02)
+        return self.bus_servo_write("<BBb", 0x38, servo_id, int(limit))
 
     def bus_servo_stop(self, servo_id):
-        data = [0x03, len(servo_id)] 
-        data.extend(struct.pack("<"+'B'*len(servo_id), *servo_id))
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
+        self.send_command(PacketFunction.PACKET_FUNC_BUS_SERVO, packer("<BB" + "B" * len(servo_id)),
+                          (0x03, len(servo_id), *servo_id))
 
     def bus_servo_set_position(self, duration, positions):
-        duration = int(duration * 1000)
-        data = [0x01, duration & 0xFF, 0xFF & (duration >> 8), len(positions)] # 0x00 is bus servo sub command
+        duration = int(duration * 1000) & 0xFFFF
+        group = (PacketFunction.PACKET_FUNC_BUS_SERVO, "<BH", (0x01, duration), "BH")
         for i in positions:
-            data.extend(struct.pack("<BH", i[0], i[1]))
-        self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, data)
+            self.send_latest(('bus_servo', int(i[0])), group, (i[0], i[1]))
+
+    def bus_servo_read_async(self, servo_id, cmd, unpack, timeout=None):
+        return self.servo_read_async(PacketFunction.PACKET_FUNC_BUS_SERVO, servo_id, cmd, unpack, timeout)
 
-    def bus_servo_read_and_unpack(self, servo_id, cmd, unpack):
-        with self.servo_read_lock:
-            self.buf_write(PacketFunction.PACKET_FUNC_BUS_SERVO, [cmd, servo_id])
-            data = self.bus_servo_queue.get(block=True)
-            servo_id, cmd, success, *info = struct.unpack(unpack, data)
-            if success == 0:
-                return info
+    def bus_servo_read_and_unpack(self, servo_id, cmd, unpack, timeout=None):
+        return self.servo_read_result(self.bus_servo_read_async(servo_id, cmd, unpack, timeout))
+
+    def bus_servo_read_many(self, servo_ids, cmd=0x05, unpack="<BBbh", timeout=None):
+        """Read the same register from several bus servos in one round trip.
+
+        All requests are sent before waiting, so six arm joints cost one reply
+        latency instead of six. Defaults to reading positions.
+
+        Returns:
+            list: One result per servo ID, None for servos that failed or timed out
+        """
+        pending = [self.bus_servo_read_async(servo_id, cmd, unpack, timeout) for servo_id in servo_ids]
+        return [self.servo_read_result(future) for future in pending]
+
+    def bus_servo_read_positions(self, servo_ids, timeout=None):
+        """Positions of several bus servos, None where a read failed."""
+        return [None if info is None else info[0]
+                for info in self.bus_servo_read_many(servo_ids, timeout=timeout)]
 
     def bus_servo_read_id(self, servo_id=254):
         return self.bus_servo_read_and_unpack(servo_id, 0x12, "<BBbB")
@@ -462,61 +1186,81 @@ class Board:
 
     def enable_reception(self, enable=True):
         self.enable_recv = enable
-
-    def recv_task(self):
+        self._wakeup()
+
+    def parse_frames(self, buf):
+        """
+        Dispatch every complete frame in buf to its parser.
+        Returns the number of leading bytes that are done with; the rest is
+        an incomplete frame that needs more data.
+        """
+        # 帧格式: 0xAA 0x55 Function Length Data Checksum, 校验覆盖 Function 到 Data
+        pos = 0
+        end = len(buf)
         while True:
-            if self.enable_recv:
-                recv_data = self.port.read()
-                if recv_data:
-                    for dat in recv_data:
-                        # print("%0.2X "%dat)
-                        if self.state == PacketControllerState.PACKET_CONTROLLER_STATE_STARTBYTE1:
-                            if dat == 0xAA:
-                                self.state = PacketControllerState.PACKET_CONTROLLER_STATE_STARTBYTE2
-                            continue
-                        elif self.state == PacketControllerState.PACKET_CONTROLLER_STATE_STARTBYTE2:
-                            if dat == 0x55:
-                                self.state = PacketControllerState.PACKET_CONTROLLER_STATE_FUNCTION
-                            else:
-                                self.state = PacketControllerState.PACKET_CONTROLLER_STATE_STARTBYTE1
-                            continue
-                        elif self.state == PacketControllerState.PACKET_CONTROLLER_STATE_FUNCTION:
-                            if dat < int(PacketFunction.PACKET_FUNC_NONE):
-                                self.frame = [dat, 0]
-                                self.state = PacketControllerState.PACKET_CONTROLLER_STATE_LENGTH
-                            else:
-                                self.frame = []
-                                self.state = PacketControllerState.PACKET_CONTROLLER_STATE_STARTBYTE1
-                            continue
-                        elif self.state == PacketControllerState.PACKET_CONTROLLER_STATE_LENGTH:
-                            self.frame[1] = dat
-                            self.recv_count = 0
-                            if dat == 0:
-                                self.state = PacketControllerState.PACKET_CONTROLLER_STATE_CHECKSUM
-                            else:
-                                self.state = PacketControllerState.PACKET_CONTROLLER_STATE_DATA
-                            continue
-                        elif self.state == PacketControllerState.PACKET_CONTROLLER_STATE_DATA:
-                            self.frame.append(dat)
-                            self.recv_count += 1
-                            if self.recv_count >= self.frame[1]:
-                                self.state = PacketControllerState.PACKET_CONTROLLER_STATE_CHECKSUM
-                            continue
-                        elif self.state == PacketControllerState.PACKET_CONTROLLER_STATE_CHECKSUM:
-                            crc8 = checksum_crc8(bytes(self.frame))
-                            if crc8 == dat:
-                                func = PacketFunction(self.frame[0])
-                                data = bytes(self.frame[2:])
-                                if func in self.parsers:
-                                    self.parsers[func](data)
-                            else:
-                                print("校验失败")
-                            self.state = PacketControllerState.PACKET_CONTROLLER_STATE_STARTBYTE1
-                            continue
+            start = buf.find(b'\xaa\x55', pos)
+            if start < 0:
+                # 末尾的 0xAA 可能是下一帧的第一个字节
+                if end > pos and buf[end - 1] == 0xAA:
+                    return end - 1
+                return end
+            if start + 4 > end:
+                return start
+            func = buf[start + 2]
+            if func >= PacketFunction.PACKET_FUNC_NONE:
+                pos = start + 2
+                continue
+            frame_end = start + 5 + buf[start + 3]
+            if frame_end > end:
+                return start
+            if checksum_crc8(buf[start + 2:frame_end - 1]) == buf[frame_end - 1]:
+                parser = self.parsers.get(func)
+                if parser is not None:
+                    parser(bytes(buf[start + 4:frame_end - 1]))
+                pos = frame_end
             else:
-                time.sleep(0.01)
-        self.port.close()
-        print("END...")
+                self.crc_errors += 1
+                print("校验失败")
+                # 可能是数据中的假帧头, 从下一个字节重新同步
+                pos = start + 2
+
+    def recv_task(self):
+        # 只在串口有数据或被唤醒时返回, 不做定时轮询
+        selector = selectors.DefaultSelector()
+        selector.register(self.wakeup_r, selectors.EVENT_READ)
+        port_fd = self.port.fileno()
+        watching_port = False
+        try:
+            while self.running:
+                if self.enable_recv != watching_port:
+                    if self.enable_recv:
+                        selector.register(port_fd, selectors.EVENT_READ)
+                    else:
+                        selector.unregister(port_fd)
+                    watching_port = self.enable_recv
+                # 有读请求在途时最多等到最近的截止时间
+                next_deadline = self._expire_reads(time.monotonic())
+                timeout = None if next_deadline is None else max(0, next_deadline - time.monotonic())
+                for key, _ in selector.select(timeout):
+                    if key.fd == self.wakeup_r:
+                        try:
+                            os.read(self.wakeup_r, 64)
+                        except BlockingIOError:
+                            pass
+                    elif self.enable_recv:
+                        # 一次读完缓冲区中所有数据
+                        recv_data = self.port.read(self.port.in_waiting or 1)
+                        if recv_data:
+                            # 同一次读到的帧共用主机接收时间戳
+                            self.recv_stamp = time.time()
+                            self.recv_buffer += recv_data
+                            del self.recv_buffer[:self.parse_frames(self.recv_buffer)]
+                            self._flush_imu(self.recv_stamp)
+        except (OSError, serial.SerialException) as e:
+            if self.running:
+                print("接收错误:", e)
+        finally:
+            selector.close()
 
 def bus_servo_test(board):
     board.bus_servo_set_position(1, [[1, 500], [2, 500]])
@@ -601,4 +1345,5 @@ if __name__ == "__main__":
             time.sleep(0.001)
         except KeyboardInterrupt:
             break
+    board.close()
 
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# TelemetryRing 并发读写测试: 一个线程不断 extend, 另一个线程不断 since()
+import sys
+import threading
+import numpy as np
+from ros_robot_controller_sdk import TelemetryRing
+
+class PausingSamples(np.ndarray):
+    """Samples array that parks the writer right after its first slot write."""
+    entered = None
+    resume = None
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if self.entered is not None and not self.entered.is_set():
+            self.entered.set()
+            self.resume.wait()
+
+def test_since_drops_slots_being_written():
+    ring = TelemetryRing(64, (3,), np.float64)
+    stamps = np.arange(64, dtype=np.float64)
+    ring.extend(np.repeat(stamps[:, None], 3, axis=1), stamps)
+    ring.samples = ring.samples.view(PausingSamples)
+    PausingSamples.entered, PausingSamples.resume = threading.Event(), threading.Event()
+    try:
+        # 写线程写完样本、还没写时间戳和 count 时停住
+        stamps = stamps + 64
+        writer = threading.Thread(target=ring.extend,
+                                  args=(np.repeat(stamps[:, None], 3, axis=1), stamps))
+        writer.start()
+        assert PausingSamples.entered.wait(1.0)
+        got_stamps, got_samples = ring.since(-1.0)
+        PausingSamples.resume.set()
+        writer.join()
+    finally:
+        PausingSamples.entered = PausingSamples.resume = None
+    assert np.all(np.asarray(got_samples) == got_stamps[:, None])
+    got_stamps, got_samples = ring.since(-1.0)
+    assert np.array_equal(got_stamps, stamps)
+    assert np.all(np.asarray(got_samples) == stamps[:, None])
+
+def test_since_never_returns_torn_samples(duration=2.0):
+    ring = TelemetryRing(64, (3,), np.float64)
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        # 样本值等于它的时间戳, 读到不一致就说明拿到了被覆盖的槽位
+        n = 0
+        rng = np.random.default_rng(0)
+        while not stop.is_set():
+            size = int(rng.integers(1, 200))
+            stamps = np.arange(n, n + size, dtype=np.float64)
+            ring.extend(np.repeat(stamps[:, None], 3, axis=1), stamps)
+            n += size
+
+    def reader():
+        while not stop.is_set():
+            stamps, samples = ring.since(-1.0)
+            if np.any(np.diff(stamps) != 1.0):
+                errors.append('stamps not contiguous: %r' % stamps)
+            elif np.any(samples != stamps[:, None]):
+                errors.append('samples do not match stamps: %r' % stamps)
+            if errors:
+                stop.set()
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+        for t in threads:
+            t.start()
+        stop.wait(duration)
+        stop.set()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors, errors[0]
+
+if __name__ == '__main__':
+    test_since_drops_slots_being_written()
+    test_since_never_returns_torn_samples()
+    print('ok')
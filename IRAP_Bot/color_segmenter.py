@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# encoding:utf-8
+import cv2
+import numpy as np
+
+
+class ColorSegmenter:
+    """
+    Labels every configured color in one pass over an HSV image.
+
+    Each (lower, upper) range is an axis-aligned box in HSV space, so it is
+    split into one bit per channel in three 256-entry lookup tables. Three
+    cv2.LUT calls and two ANDs give, per pixel, the bitmask of ranges that
+    contain it; a last table turns that bitmask into a color label. Blobs
+    come from a single connected-components pass over the label image, so
+    the cost barely moves as colors are added to color_ranges.
+    """
+
+    # ranges per uint8 bitmask plane
+    PLANE_BITS = 8
+
+    def __init__(self, color_ranges, min_area=1500, kernel_size=5):
+        self.names = list(color_ranges)
+        self.min_area = min_area
+        self.kernel = np.ones((kernel_size, kernel_size), np.uint8)
+
+        ranges = [(label, lower, upper)
+                  for label, name in enumerate(self.names, 1)
+                  for lower, upper in color_ranges[name]]
+
+        self.planes = []
+        for start in range(0, len(ranges), self.PLANE_BITS):
+            group = ranges[start:start + self.PLANE_BITS]
+            luts = np.zeros((3, 256), np.uint8)
+            to_label = np.zeros(256, np.uint8)
+            for bit, (label, lower, upper) in enumerate(group):
+                for ch in range(3):
+                    luts[ch, lower[ch]:upper[ch] + 1] |= 1 << bit
+            # first color in color_ranges order wins where ranges overlap
+            for mask in range(255, 0, -1):
+                for bit, (label, _, _) in enumerate(group):
+                    if mask & (1 << bit):
+                        to_label[mask] = label
+                        break
+            self.planes.append((luts[0], luts[1], luts[2], to_label))
+
+    def label(self, hsv):
+        """Label image: 0 for background, i + 1 for self.names[i]."""
+        h, s, v = cv2.split(hsv)
+        labels = None
+        for lut_h, lut_s, lut_v, to_label in self.planes:
+            bits = cv2.bitwise_and(cv2.LUT(h, lut_h), cv2.LUT(s, lut_s))
+            bits = cv2.bitwise_and(bits, cv2.LUT(v, lut_v))
+            plane = cv2.LUT(bits, to_label)
+            if labels is None:
+                labels = plane
+            else:
+                np.copyto(labels, plane, where=labels == 0)
+        return labels
+
+    def detect(self, hsv):
+        """
+        Largest blob per color with area above min_area.
+        Returns {color_name: (x, y, w, h, area)}.
+        """
+        labels = self.label(hsv)
+
+        # open all colors at once, then cut the seams between two different
+        # colors so every 8-connected component carries exactly one label
+        fg = cv2.morphologyEx(cv2.compare(labels, 0, cv2.CMP_GT), cv2.MORPH_OPEN, self.kernel)
+        self._cut_seams(fg[:, 1:], labels[:, 1:], labels[:, :-1])
+        self._cut_seams(fg[1:, :], labels[1:, :], labels[:-1, :])
+        self._cut_seams(fg[1:, 1:], labels[1:, 1:], labels[:-1, :-1])
+        self._cut_seams(fg[1:, :-1], labels[1:, :-1], labels[:-1, 1:])
+
+        _, components, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            fg, 8, cv2.CV_32S, cv2.CCL_GRANA)
+
+        found = {}
+        areas = stats[:, cv2.CC_STAT_AREA]
+        # component 0 is the background; only large blobs need their label looked up
+        for idx in np.flatnonzero(areas[1:] > self.min_area) + 1:
+            x, y, w, h, area = (int(v) for v in stats[idx])
+            box = components[y:y + h, x:x + w] == idx
+            name = self.names[labels[y:y + h, x:x + w][box][0] - 1]
+            if name not in found or area > found[name][4]:
+                found[name] = (x, y, w, h, area)
+        return found
+
+    @staticmethod
+    def _cut_seams(fg, labels, neighbour):
+        """Clear fg wherever the neighbour has a different, non-background label."""
+        seam = cv2.bitwise_and(cv2.compare(labels, neighbour, cv2.CMP_NE),
+                               cv2.compare(neighbour, 0, cv2.CMP_NE))
+        cv2.bitwise_and(fg, cv2.bitwise_not(seam), dst=fg)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# encoding:utf-8
+import cv2
+from collections import namedtuple
+
+# box 为 (x, y, w, h, area), velocity 为框中心速度 (vx, vy), 单位 像素/秒
+Track = namedtuple('Track', ['track_id', 'name', 'box', 'velocity'])
+
+
+class ColorTracker:
+    """
+    Follows the largest blob of each color from frame to frame.
+
+    Each frame only small windows around the predicted position of every
+    track are converted to HSV and searched. The whole frame is scanned
+    when a track is lost, when nothing is tracked yet, and every
+    rescan_interval frames so newly visible colors are picked up.
+    """
+
+    def __init__(self, segmenter, margin=0.5, min_pad=8, rescan_interval=15, smoothing=0.5):
+        self.segmenter = segmenter
+        self.margin = margin
+        self.min_pad = min_pad
+        self.rescan_interval = rescan_interval
+        self.smoothing = smoothing
+        self.tracks = {}
+        self.next_id = 1
+        self.frames_since_scan = 0
+        self.last_stamp = None
+
+    def update(self, frame, stamp):
+        """Search a BGR frame and return the current tracks as a tuple of Track."""
+        dt = 0.0 if self.last_stamp is None else max(stamp - self.last_stamp, 0.0)
+        self.last_stamp = stamp
+
+        found = {}
+        full_scan = not self.tracks or self.frames_since_scan >= self.rescan_interval
+        if not full_scan:
+            for name, track in self.tracks.items():
+                box = self._search_window(frame, track, dt)
+                if box is None:
+                    full_scan = True
+                    break
+                found[name] = box
+
+        if full_scan:
+            found = self.segmenter.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV))
+            self.frames_since_scan = 0
+        else:
+            self.frames_since_scan += 1
+
+        for name in list(self.tracks):
+            if name not in found:
+                del self.tracks[name]
+        for name, box in found.items():
+            track = self.tracks.get(name)
+            if track is None:
+                self.tracks[name] = Track(self.next_id, name, box, (0.0, 0.0))
+                self.next_id += 1
+            else:
+                self.tracks[name] = self._advance(track, box, dt)
+        return tuple(self.tracks.values())
+
+    def _search_window(self, frame, track, dt):
+        x, y, w, h, _ = track.box
+        vx, vy = track.velocity
+        pad_x = max(self.min_pad, int(w * self.margin))
+        pad_y = max(self.min_pad, int(h * self.margin))
+        x0 = max(0, int(x + vx * dt) - pad_x)
+        y0 = max(0, int(y + vy * dt) - pad_y)
+        x1 = min(frame.shape[1], int(x + vx * dt) + w + pad_x)
+        y1 = min(frame.shape[0], int(y + vy * dt) + h + pad_y)
+        if x1 - x0 < 3 or y1 - y0 < 3:
+            return None
+
+        hsv = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+        box = self.segmenter.detect(hsv).get(track.name)
+        if box is None:
+            return None
+        bx, by, bw, bh, area = box
+        return (bx + x0, by + y0, bw, bh, area)
+
+    def _advance(self, track, box, dt):
+        if dt <= 0:
+            return Track(track.track_id, track.name, box, track.velocity)
+        ox, oy, ow, oh, _ = track.box
+        x, y, w, h, _ = box
+        vx = ((x + w / 2) - (ox + ow / 2)) / dt
+        vy = ((y + h / 2) - (oy + oh / 2)) / dt
+        a = self.smoothing
+        velocity = (a * vx + (1 - a) * track.velocity[0],
+                    a * vy + (1 - a) * track.velocity[1])
+        return Track(track.track_id, track.name, box, velocity)
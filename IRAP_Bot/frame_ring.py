@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# encoding:utf-8
+import os
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class FrameRing:
+    """
+    Multi-slot frame ring in shared memory.
+
+    One writer publishes frames, any number of readers in this or child
+    processes wait for a newer sequence number and copy the slot out.
+    Each slot carries its own sequence number (seqlock style) so a reader
+    that was lapped by the writer notices and retries instead of returning
+    a torn frame.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, slots=4, name=None, create=True, cond=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        # header: [latest_seq, slot_seq * slots] int64 + slot timestamps float64
+        self.header_bytes = 8 * (1 + slots) + 8 * slots
+        self.header_bytes = (self.header_bytes + 63) // 64 * 64
+        size = self.header_bytes + self.frame_bytes * slots
+
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        # pid, not a flag: forked children inherit this object as-is
+        self.owner_pid = os.getpid() if create else None
+        self.cond = cond if cond is not None else multiprocessing.Condition()
+        self._map()
+        if create:
+            self.seq[:] = 0
+            self.latest[0] = 0
+
+    def _map(self):
+        buf = self.shm.buf
+        self.latest = np.ndarray((1,), np.int64, buf, 0)
+        self.seq = np.ndarray((self.slots,), np.int64, buf, 8)
+        self.stamps = np.ndarray((self.slots,), np.float64, buf, 8 * (1 + self.slots))
+        self.frames = np.ndarray((self.slots,) + self.shape, self.dtype, buf, self.header_bytes)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __getstate__(self):
+        # Passed to multiprocessing.Process as an argument: re-attach by name
+        return {'shape': self.shape, 'dtype': self.dtype.str, 'slots': self.slots,
+                'name': self.shm.name, 'cond': self.cond}
+
+    def __setstate__(self, state):
+        self.__init__(state['shape'], state['dtype'], state['slots'],
+                      name=state['name'], create=False, cond=state['cond'])
+
+    def publish(self, frame, stamp=None):
+        """Write a frame into the next slot and return its sequence number."""
+        seq = int(self.latest[0]) + 1
+        i = seq % self.slots
+        self.seq[i] = -1
+        np.copyto(self.frames[i], frame, casting='unsafe')
+        self.stamps[i] = time.time() if stamp is None else stamp
+        self.seq[i] = seq
+        with self.cond:
+            self.latest[0] = seq
+            self.cond.notify_all()
+        return seq
+
+    def latest_seq(self):
+        return int(self.latest[0])
+
+    def read(self, out=None):
+        """
+        Copy the newest frame out of the ring.
+        Returns (seq, stamp, frame), or (0, 0.0, None) before the first publish.
+        """
+        while True:
+            seq = int(self.latest[0])
+            if seq == 0:
+                return 0, 0.0, None
+            i = seq % self.slots
+            if out is None:
+                out = np.empty(self.shape, self.dtype)
+            np.copyto(out, self.frames[i])
+            stamp = float(self.stamps[i])
+            # slot rewritten while copying: retry with the newer frame
+            if int(self.seq[i]) == seq:
+                return seq, stamp, out
+
+    def wait(self, last_seq, timeout=None, out=None):
+        """
+        Block until a frame newer than last_seq is published.
+        Returns (seq, stamp, frame), or (last_seq, 0.0, None) on timeout.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: int(self.latest[0]) > last_seq, timeout):
+                return last_seq, 0.0, None
+        return self.read(out)
+
+    def close(self):
+        if self.shm is None:
+            return
+        # drop numpy views first, SharedMemory refuses to close while exported
+        self.latest = self.seq = self.stamps = self.frames = None
+        self.shm.close()
+        if self.owner_pid == os.getpid():
+            self.shm.unlink()
+        self.shm = None
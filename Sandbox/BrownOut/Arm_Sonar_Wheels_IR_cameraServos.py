@@ -15,6 +15,8 @@ import time
 import random
 import threading
 import os
+import sys
+from pathlib import Path
 import cv2
 from flask import Flask, Response
 import lgpio as GPIO
@@ -22,6 +24,10 @@ from adafruit_servokit import ServoKit
 import RPi.GPIO as RPiGPIO
 from gpiozero import DigitalInputDevice
 
+sys.path.append(str(Path(__file__).resolve().parents[2] / 'ACP_comm_test'))
+from ACP.acpcomms.python3.frame_broadcaster import FrameBroadcaster
+from ACP.acpcomms.python3.jpeg_encoder import JpegEncoder
+
 # ============================================================
 # DC MOTORS
 # ============================================================
@@ -194,15 +200,17 @@ def smooth_random_sweep(ch, step=0.05, delay=0.05):
 # ============================================================
 app = Flask(__name__)
 camera = cv2.VideoCapture(0)
+broadcaster = FrameBroadcaster()
 
-def generate_frames():
+def capture_loop():
+    # single camera reader, every viewer shares the same encoded frame
+    encoder = JpegEncoder()
     while True:
         success, frame = camera.read()
         if not success:
             break
-        _, buffer = cv2.imencode('.jpg', frame)
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+        broadcaster.publish(encoder.encode(frame))
+    broadcaster.close()
 
 @app.route('/')
 def index():
@@ -210,7 +218,7 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(broadcaster.mjpegStream(), mimetype=broadcaster.mjpegMimetype())
 
 def open_chromium():
     time.sleep(2)
@@ -236,6 +244,7 @@ if __name__ == "__main__":
             threading.Thread(target=servo_random_loop, daemon=True),
             threading.Thread(target=lambda: smooth_random_sweep(0), daemon=True),
             threading.Thread(target=lambda: smooth_random_sweep(1), daemon=True),
+            threading.Thread(target=capture_loop, daemon=True),
             threading.Thread(target=flask_loop, daemon=True),
         ]
 
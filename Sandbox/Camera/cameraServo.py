@@ -3,9 +3,15 @@ import cv2
 import threading
 import time
 import os
+import sys
 import random
+from pathlib import Path
 from adafruit_servokit import ServoKit
 
+sys.path.append(str(Path(__file__).resolve().parents[2] / 'ACP_comm_test'))
+from ACP.acpcomms.python3.frame_broadcaster import FrameBroadcaster
+from ACP.acpcomms.python3.jpeg_encoder import JpegEncoder
+
 # --------------------------
 # Servo setup
 # --------------------------
@@ -35,16 +41,17 @@ threading.Thread(target=smooth_random_sweep, args=(1,), daemon=True).start()
 # --------------------------
 app = Flask(__name__)
 camera = cv2.VideoCapture(0)  # Use /dev/video0
+broadcaster = FrameBroadcaster()
 
-def generate_frames():
+def capture_loop():
+    """Only reader of the camera: encode each frame once for every viewer."""
+    encoder = JpegEncoder()
     while True:
         success, frame = camera.read()
         if not success:
             break
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        broadcaster.publish(encoder.encode(frame))
+    broadcaster.close()
 
 @app.route('/')
 def index():
@@ -52,8 +59,8 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(broadcaster.mjpegStream(),
+                    mimetype=broadcaster.mjpegMimetype())
 
 def open_chromium():
     """Wait for Flask to start, then open Chromium at localhost."""
@@ -65,6 +72,7 @@ def open_chromium():
 # Main program
 # --------------------------
 if __name__ == '__main__':
+    threading.Thread(target=capture_loop, daemon=True).start()
     threading.Thread(target=open_chromium, daemon=True).start()
 
     print("🎥 Starting Flask camera stream with servo control...")